@@ -0,0 +1,49 @@
+import hashlib
+import re
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+PAGE_KINDS = ('search', 'movie', 'torrent')
+
+
+class Corpus:
+    """
+    Saved search, movie and torrent pages, served in place of the live site.
+
+    Pages are grouped by kind, one directory per kind. Any URL is answered with a page of the kind matching its path,
+    preferably the one whose name appears in the URL, so links found in a saved page always resolve to another saved
+    page.
+    """
+
+    def __init__(self, directory: Path = FIXTURES_DIR):
+        self.pages: dict[str, dict[str, str]] = {
+            kind: {path.stem: path.read_text(encoding='utf-8') for path in sorted((directory / kind).glob('*.html'))}
+            for kind in PAGE_KINDS
+        }
+
+        empty = [kind for kind, pages in self.pages.items() if not pages]
+        if empty:
+            raise FileNotFoundError(f"No saved pages for {', '.join(empty)} in {directory}")
+
+    @staticmethod
+    def kind(url: str) -> str:
+        if '/movie/' in url:
+            return 'movie'
+        if '/torrent/' in url:
+            return 'torrent'
+        return 'search'
+
+    def page(self, url: str) -> str:
+        pages = self.pages[self.kind(url)]
+        path = re.sub(r'\+|%20', '-', url.lower())
+        name = next((name for name in pages if name in path), None)
+        if name is None:
+            names = list(pages)
+            name = names[int(hashlib.sha256(url.encode('utf-8')).hexdigest(), 16) % len(names)]
+        return pages[name]
+
+    def fetch_url(self, url: str, *args, **kwargs) -> str:
+        """
+        Drop-in replacement for `RobustFetcher.fetch_url`.
+        """
+        return self.page(url)
@@ -0,0 +1,140 @@
+"""
+End-to-end crawl benchmark against the local mock website.
+
+Runs `SearchEngine.search` for each query against `benchmarks.mock_server` and reports the wall time, the requests
+received by the server, the pages fetched more than once and how the fetcher obtained each page. Concurrency, cache
+and retry settings are read from the usual environment variables.
+
+    python -m benchmarks.crawl "the matrix" heat --latency 0.1 --deny-rate 0.05
+    CRAWL_WORKERS=16 python -m benchmarks.crawl --repeat 3 --cache
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from benchmarks.corpus import Corpus
+from benchmarks.mock_server import MockServer
+
+
+class DisabledBrowsers:
+    """
+    Stands in for the browser pool, so the fallback is still taken and counted but no browser is ever started.
+    """
+
+    @contextmanager
+    def browser(self):
+        raise RuntimeError("The browser fallback is disabled in the benchmark.")
+        yield
+
+    def close(self):
+        pass
+
+
+def run_query(engine, requests, server: MockServer, query: str) -> dict:
+    server.reset()
+    requests.reset_stats()
+
+    start_time = time.perf_counter()
+    movies = engine.search(query, force=True)
+    wall_time = time.perf_counter() - start_time
+
+    return {
+        'query': query,
+        'movies': len(movies),
+        'wall_time': wall_time,
+        'server': server.stats,
+        'fetcher': requests.stats,
+    }
+
+
+def print_results(results: list[dict]):
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Crawl benchmark")
+    table.add_column("Query", no_wrap=True)
+    table.add_column("Movies", justify="right")
+    table.add_column("Wall (s)", justify="right")
+    table.add_column("Requests", justify="right")
+    table.add_column("Duplicates", justify="right")
+    table.add_column("Errors", justify="right")
+    table.add_column("Denied", justify="right")
+    table.add_column("Retries", justify="right")
+    table.add_column("Throttled", justify="right")
+    table.add_column("Cache hits", justify="right")
+    table.add_column("Selenium", justify="right")
+    table.add_column("Failed", justify="right")
+
+    for result in results:
+        server, fetcher = result['server'], result['fetcher']
+        table.add_row(
+            result['query'],
+            str(result['movies']),
+            f"{result['wall_time']:.2f}",
+            str(server['requests']),
+            str(server['duplicates']),
+            str(server['errors']),
+            str(server['denied']),
+            str(fetcher.get('retries', 0)),
+            str(fetcher.get('throttled', 0)),
+            str(fetcher.get('cache_hits', 0) + fetcher.get('revalidated', 0)),
+            str(fetcher.get('selenium', 0)),
+            str(fetcher.get('failed', 0)),
+        )
+
+    Console().print(table)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the search crawl against a local mock website.")
+    parser.add_argument("queries", nargs="*", default=["the matrix", "heat"], help="Search queries.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times each query is searched.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Maximum random seconds added on top of the latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    parser.add_argument("--deny-rate", type=float, default=0.0, help="Fraction of requests answered with access denied.")
+    parser.add_argument("--seed", type=int, default=1337, help="Seed of the injected faults.")
+    parser.add_argument("--cache", action="store_true", help="Keep the page cache enabled between searches.")
+    parser.add_argument("--browser", action="store_true", help="Let the fallback start real browsers.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    server = MockServer(
+        Corpus(), latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, deny_rate=args.deny_rate,
+        seed=args.seed,
+    ).start()
+
+    # Point the application at the mock website, with its store, logs and cache kept away from the real ones
+    home = tempfile.mkdtemp(prefix="crawl-benchmark-")
+    atexit.register(shutil.rmtree, home, ignore_errors=True)
+    os.environ['HOME'] = home
+    os.environ['TORRENT_BASE_URL'] = server.url
+    os.environ['HTTP_CACHE_ENABLED'] = 'true' if args.cache else 'false'
+
+    from src.core.search import SearchEngine
+    from src.utils.requests import requests
+
+    if not args.browser:
+        requests.browsers = DisabledBrowsers()
+
+    engine = SearchEngine(interactive=False)
+    try:
+        results = [run_query(engine, requests, server, query) for _ in range(args.repeat) for query in args.queries]
+    finally:
+        server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
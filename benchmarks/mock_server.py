@@ -0,0 +1,188 @@
+"""
+Local stand-in for the torrent website, serving the benchmark corpus.
+
+Latency, server errors and "access denied" pages can be injected to reproduce a slow or defensive website.
+
+    python -m benchmarks.mock_server --port 8000 --latency 0.2 --deny-rate 0.05
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from benchmarks.corpus import Corpus
+
+ACCESS_DENIED_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head><title>Access denied | 1337x.to used Cloudflare to restrict access</title></head>
+<body>
+<div id="cf-wrapper">
+<h1><span class="cf-error-type">Error</span> <span class="cf-error-code">1020</span></h1>
+<h2 class="cf-subheadline">Access denied</h2>
+<p>The site owner may have set restrictions that prevent you from accessing the site.</p>
+</div>
+</body>
+</html>
+"""
+
+PAGE_PREFIXES = ('/sort-category-search/', '/search/', '/movie/', '/torrent/')
+
+
+class MockServer:
+    """
+    Threaded HTTP server answering search, movie and torrent paths with pages from the corpus.
+
+    Every request is delayed by the latency plus a random jitter, then answered with a server error or an
+    "access denied" page at the given rates. Requests are counted per path to reveal pages fetched more than once.
+    """
+
+    def __init__(
+            self,
+            corpus: Corpus,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            deny_rate: float = 0.0,
+            seed: int = None,
+    ):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.deny_rate = deny_rate
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._paths = Counter()
+        self._responses = Counter()
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Number of requests received, distinct paths requested, requests for an already requested path, and
+        responses sent by status.
+        """
+        with self._lock:
+            requests = sum(self._paths.values())
+            return {
+                'requests': requests,
+                'unique': len(self._paths),
+                'duplicates': requests - len(self._paths),
+                'ok': self._responses['ok'],
+                'errors': self._responses['error'],
+                'denied': self._responses['denied'],
+                'not_found': self._responses['not_found'],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._paths.clear()
+            self._responses.clear()
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, path: str) -> tuple[int, str, str]:
+        """
+        Picks the response for a path.
+
+        :return: Status code, outcome counted in the stats and page.
+        """
+        with self._lock:
+            self._paths[path] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+
+        if delay:
+            time.sleep(delay)
+
+        if not urlparse(path).path.startswith(PAGE_PREFIXES):
+            status, outcome, page = 404, 'not_found', "<html><body><h1>Page not found</h1></body></html>"
+        elif roll < self.error_rate:
+            status, outcome, page = 503, 'error', "<html><body><h1>503 Service Temporarily Unavailable</h1></body></html>"
+        elif roll < self.error_rate + self.deny_rate:
+            status, outcome, page = 403, 'denied', ACCESS_DENIED_PAGE
+        else:
+            status, outcome, page = 200, 'ok', self.corpus.page(path)
+
+        with self._lock:
+            self._responses[outcome] += 1
+        return status, outcome, page
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, _, page = self.server.mock.respond(self.path)
+        body = page.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Serve the benchmark corpus as a local torrent website.")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added on top of the latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    parser.add_argument("--deny-rate", type=float, default=0.0, help="Fraction of requests answered with access denied.")
+    parser.add_argument("--seed", type=int, help="Seed of the injected faults.")
+    args = parser.parse_args(argv)
+
+    server = MockServer(
+        Corpus(), host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, deny_rate=args.deny_rate, seed=args.seed,
+    )
+    print(f"Serving the corpus on {server.url}, run the crawler with TORRENT_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(server.stats)
+
+
+if __name__ == '__main__':
+    main()
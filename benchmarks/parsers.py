@@ -0,0 +1,210 @@
+"""
+Offline benchmark of the page parsers and schema constructors.
+
+Every page is served from the saved corpus under `benchmarks/fixtures`, so the benchmark never touches the network.
+For each parser it reports the throughput, the p50 and p95 latency per page (or per string for the `from_string`
+constructors) and the peak memory allocated while parsing a single page.
+
+    python -m benchmarks.parsers
+    python -m benchmarks.parsers --parser html.parser --json > baseline.json
+    python -m benchmarks.parsers --baseline baseline.json
+"""
+import argparse
+import atexit
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+from benchmarks.corpus import Corpus
+
+DATE_PATTERN = re.compile(r'<span>(\d+ \w+ ago)</span>')
+SIZE_PATTERN = re.compile(r'(\d+(?:\.\d+)? [KMG]B)')
+
+
+@dataclass
+class Target:
+    name: str
+    function: Callable
+    inputs: list
+    context: Callable = nullcontext
+
+
+@dataclass
+class Result:
+    name: str
+    parser: str
+    operations: int
+    ops_per_second: float
+    p50_ms: float
+    p95_ms: float
+    peak_memory_kb: float
+
+
+def build_targets(corpus: Corpus) -> list[Target]:
+    # The application is imported only once the environment points it at the temporary home and chosen parser
+    from src.constants import TORRENT_BASE_URL
+    from src.schemas.movie_schema import Movie
+    from src.schemas.torrent_schema import Torrent, Comment, Date, Size
+    from src.utils.html import parse_html, link_strainer
+    from src.utils.requests import requests
+
+    requests.fetch_url = corpus.fetch_url
+
+    search_pages = list(corpus.pages['search'].values())
+    movie_urls = [f"{TORRENT_BASE_URL}/movie/{name}/" for name in corpus.pages['movie']]
+    torrent_urls = [f"{TORRENT_BASE_URL}/torrent/{name}/" for name in corpus.pages['torrent']]
+    torrent_pages = list(corpus.pages['torrent'].values())
+    dates = [date for page in torrent_pages for date in DATE_PATTERN.findall(page)]
+    sizes = [size for page in search_pages + torrent_pages for size in SIZE_PATTERN.findall(page)]
+
+    @contextmanager
+    def parsed_torrents():
+        # Torrents linked from a movie page are benchmarked on their own, reuse parsed ones to time the movie page alone
+        parsed = [Torrent.from_url(url) for url in torrent_urls]
+        from_url = Torrent.from_url
+        Torrent.from_url = lambda url: parsed[hash(url) % len(parsed)]
+        try:
+            yield
+        finally:
+            Torrent.from_url = from_url
+
+    return [
+        Target("search links", lambda page: parse_html(page, parse_only=link_strainer("/torrent/")), search_pages),
+        Target("Movie.from_url", Movie.from_url, movie_urls, parsed_torrents),
+        Target("Torrent.from_url", Torrent.from_url, torrent_urls),
+        Target("Comment.from_html", Comment.from_html, torrent_pages),
+        Target("Date.from_string", Date.from_string, dates),
+        Target("Size.from_string", Size.from_string, sizes),
+    ]
+
+
+def run_target(target: Target, parser: str, iterations: int) -> Result:
+    with target.context():
+        for item in target.inputs:
+            target.function(item)
+
+        latencies = []
+        for _ in range(iterations):
+            for item in target.inputs:
+                start_time = time.perf_counter()
+                target.function(item)
+                latencies.append(time.perf_counter() - start_time)
+
+        # Tracing slows everything down, so memory is measured in a separate pass
+        peak = 0
+        tracemalloc.start()
+        try:
+            for item in target.inputs:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                target.function(item)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return Result(
+        name=target.name,
+        parser=parser,
+        operations=len(latencies),
+        ops_per_second=len(latencies) / sum(latencies),
+        p50_ms=percentiles[49] * 1000,
+        p95_ms=percentiles[94] * 1000,
+        peak_memory_kb=peak / 1024,
+    )
+
+
+def print_results(results: list[Result], regressions: dict[str, float]):
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title=f"Parser benchmark ({results[0].parser})")
+    table.add_column("Parser", no_wrap=True)
+    table.add_column("Ops", justify="right")
+    table.add_column("Ops/s", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p95 (ms)", justify="right")
+    table.add_column("Peak (KiB)", justify="right")
+    if regressions:
+        table.add_column("vs baseline", justify="right")
+
+    for result in results:
+        row = [
+            result.name,
+            str(result.operations),
+            f"{result.ops_per_second:,.1f}",
+            f"{result.p50_ms:.3f}",
+            f"{result.p95_ms:.3f}",
+            f"{result.peak_memory_kb:,.1f}",
+        ]
+        if regressions:
+            change = regressions.get(result.name)
+            row.append("" if change is None else f"[{'red' if change > 0 else 'green'}]{change:+.0%}[/]")
+        table.add_row(*row)
+
+    Console().print(table)
+
+
+def compare(results: list[Result], path: str) -> dict[str, float]:
+    """
+    Relative change of the p50 latency of each parser against a previous run saved with `--json`.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = {result['name']: result for result in json.load(f)}
+
+    return {
+        result.name: result.p50_ms / baseline[result.name]['p50_ms'] - 1
+        for result in results
+        if result.name in baseline and baseline[result.name]['p50_ms']
+    }
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the page parsers against the saved corpus.")
+    parser.add_argument("--iterations", type=int, default=20, help="Passes over the corpus per parser.")
+    parser.add_argument("--parser", default=os.environ.get('HTML_PARSER', 'auto'), help="HTML parser backend.")
+    parser.add_argument("--only", action="append", help="Only run the parsers whose name contains this text.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    parser.add_argument("--baseline", help="Results of a previous run, saved with --json, to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown against the baseline.")
+    args = parser.parse_args(argv)
+
+    # Keep the store, logs and response cache of the benchmark away from the real ones
+    home = tempfile.mkdtemp(prefix="parser-benchmark-")
+    atexit.register(shutil.rmtree, home, ignore_errors=True)
+    os.environ['HOME'] = home
+    os.environ['HTTP_CACHE_ENABLED'] = 'false'
+    os.environ['HTML_PARSER'] = args.parser
+
+    from src.utils.html import PARSER
+
+    targets = build_targets(Corpus())
+    if args.only:
+        targets = [target for target in targets if any(name.lower() in target.name.lower() for name in args.only)]
+
+    results = [run_target(target, PARSER, args.iterations) for target in targets]
+    regressions = compare(results, args.baseline) if args.baseline else {}
+
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], indent=2))
+    else:
+        print_results(results, regressions)
+
+    regressed = [name for name, change in regressions.items() if change > args.tolerance]
+    if regressed:
+        print(f"Slower than the baseline: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
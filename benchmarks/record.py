@@ -0,0 +1,56 @@
+"""
+Saves live search, movie and torrent pages into the benchmark corpus.
+
+Follows the same path as a search: the search results, the first torrent found, and the movie that torrent belongs to.
+
+    python -m benchmarks.record "the matrix"
+"""
+import argparse
+import re
+import sys
+from urllib.parse import quote_plus
+
+from benchmarks.corpus import FIXTURES_DIR
+
+LINK_PATTERN = r'href="({prefix}[^"]+)"'
+
+
+def slug(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Save live pages into the benchmark corpus.")
+    parser.add_argument("query", help="Movie title to search for.")
+    args = parser.parse_args(argv)
+
+    from src.constants import TORRENT_BASE_URL
+    from src.utils.requests import requests
+
+    url = TORRENT_BASE_URL + f"/sort-category-search/{quote_plus(args.query)}/Movies/seeders/desc/1/"
+    pages = {}
+    # Each page is found in the one fetched before it
+    previous = None
+    for kind, prefix in (('search', None), ('torrent', '/torrent/'), ('movie', '/movie/')):
+        if prefix:
+            match = re.search(LINK_PATTERN.format(prefix=prefix), pages[previous])
+            if not match:
+                print(f"No {kind} link found in the {previous} page.", file=sys.stderr)
+                return 1
+            url = TORRENT_BASE_URL + match.group(1)
+
+        pages[kind] = requests.fetch_url(url)
+        if not pages[kind]:
+            print(f"Failed to fetch {url}", file=sys.stderr)
+            return 1
+        previous = kind
+
+    for kind, page in pages.items():
+        path = FIXTURES_DIR / kind / f"{slug(args.query)}.html"
+        path.write_text(page, encoding='utf-8')
+        print(f"Saved {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Torrent session benchmark over a loopback seeder and leecher pair.
+
+Seeds a torrent of random data from one session and downloads it with another session tuned by each profile, then
+reports the wall time, the throughput and the disk counters of the leecher. The leecher writes to a temporary
+directory unless pointed at the disk to tune for.
+
+    python -m benchmarks.session --size 1024
+    python -m benchmarks.session hdd ssd --directory /mnt/nas/downloads --files 4 --repeat 3
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+# Chunk written at once when generating the payload
+CHUNK_SIZE = 1024 * 1024
+
+# Session counters reported for the leecher
+METRICS = ('disk.num_write_ops', 'disk.num_blocks_written', 'disk.disk_write_time', 'disk.disk_hash_time')
+
+
+def loopback_settings(port: int) -> dict:
+    return {
+        'listen_interfaces': f'127.0.0.1:{port}',
+        'enable_dht': False,
+        'enable_lsd': False,
+        'enable_upnp': False,
+        'enable_natpmp': False,
+        'allow_multiple_connections_per_ip': True,
+        # uTP is tuned for congested links and would be the bottleneck over loopback
+        'enable_outgoing_utp': False,
+        'enable_incoming_utp': False,
+        'alert_mask': 0,
+    }
+
+
+def make_payload(directory: str, size: int, files: int) -> str:
+    """
+    Writes random files adding up to the given size in bytes.
+
+    :return: Path of the folder holding the files.
+    """
+    root = os.path.join(directory, 'payload')
+    os.makedirs(root, exist_ok=True)
+    for index in range(files):
+        remaining = size // files
+        with open(os.path.join(root, f'file-{index}.bin'), 'wb') as file:
+            while remaining > 0:
+                chunk = min(CHUNK_SIZE, remaining)
+                file.write(os.urandom(chunk))
+                remaining -= chunk
+    return root
+
+
+def make_torrent(lt, root: str, piece_size: int):
+    storage = lt.file_storage()
+    lt.add_files(storage, root)
+    torrent = lt.create_torrent(storage, piece_size)
+    lt.set_piece_hashes(torrent, os.path.dirname(root))
+    return lt.torrent_info(torrent.generate())
+
+
+def wait_for(predicate, timeout: float, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+
+def session_counters(lt, session) -> dict:
+    session.apply_settings({'alert_mask': lt.alert_category.stats})
+    session.post_session_stats()
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        session.wait_for_alert(500)
+        for alert in session.pop_alerts():
+            if isinstance(alert, lt.session_stats_alert):
+                return {name: alert.values[name] for name in METRICS if name in alert.values}
+    return {}
+
+
+def run_profile(lt, profile, torrent_info, seeder_port: int, directory: str, timeout: float) -> dict:
+    save_path = tempfile.mkdtemp(prefix=f'{profile.name}-', dir=directory)
+    try:
+        leecher = lt.session(loopback_settings(0))
+        applied = profile.apply(leecher)
+
+        params = lt.add_torrent_params()
+        params.ti = torrent_info
+        params.save_path = save_path
+        params.storage_mode = profile.storage_mode
+
+        start_time = time.perf_counter()
+        handle = leecher.add_torrent(params)
+        handle.connect_peer(('127.0.0.1', seeder_port))
+        finished = wait_for(lambda: handle.status().is_seeding, timeout)
+        wall_time = time.perf_counter() - start_time
+
+        counters = session_counters(lt, leecher)
+        downloaded = handle.status().total_wanted_done
+        leecher.remove_torrent(handle)
+        del leecher
+    finally:
+        shutil.rmtree(save_path, ignore_errors=True)
+
+    return {
+        'profile': profile.name,
+        'finished': finished,
+        'wall_time': wall_time,
+        'throughput': downloaded / wall_time / 1024 ** 2,
+        'settings': len(applied),
+        'counters': counters,
+    }
+
+
+def print_results(results: list[dict]):
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Session benchmark")
+    table.add_column("Profile", no_wrap=True)
+    table.add_column("Settings", justify="right")
+    table.add_column("Wall (s)", justify="right")
+    table.add_column("MiB/s", justify="right")
+    table.add_column("Write ops", justify="right")
+    table.add_column("Blocks written", justify="right")
+    table.add_column("Write time (ms)", justify="right")
+    table.add_column("Hash time (ms)", justify="right")
+
+    for result in results:
+        counters = result['counters']
+        table.add_row(
+            result['profile'] + ("" if result['finished'] else " (timed out)"),
+            str(result['settings']),
+            f"{result['wall_time']:.2f}",
+            f"{result['throughput']:.1f}",
+            str(counters.get('disk.num_write_ops', '-')),
+            str(counters.get('disk.num_blocks_written', '-')),
+            str(counters.get('disk.disk_write_time', 0) // 1000),
+            str(counters.get('disk.disk_hash_time', 0) // 1000),
+        )
+
+    Console().print(table)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the torrent session profiles over a loopback connection.")
+    parser.add_argument("profiles", nargs="*", help="Profiles to compare, all of them by default.")
+    parser.add_argument("--size", type=int, default=256, help="Size of the torrent in MiB.")
+    parser.add_argument("--files", type=int, default=1, help="Number of files in the torrent.")
+    parser.add_argument("--piece-size", type=int, default=0, help="Piece size in KiB, chosen by libtorrent by default.")
+    parser.add_argument("--directory", help="Directory the leecher writes to, a temporary one by default.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of downloads per profile.")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds after which a download is given up.")
+    parser.add_argument("--port", type=int, default=6990, help="Port the seeder listens on.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    # Keep the store, logs and cache of the application away from the real ones
+    home = tempfile.mkdtemp(prefix="session-benchmark-")
+    atexit.register(shutil.rmtree, home, ignore_errors=True)
+    os.environ['HOME'] = home
+
+    import libtorrent as lt
+    from src.core.tuning import PROFILES
+
+    # libtorrent 2.1 deprecates the torrent creation functions of 2.0, which the project is pinned to
+    warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+    unknown = [name for name in args.profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profiles {', '.join(unknown)}, the profiles are: {', '.join(PROFILES)}")
+    profiles = [PROFILES[name] for name in args.profiles or PROFILES]
+
+    directory = args.directory or home
+    os.makedirs(directory, exist_ok=True)
+
+    root = make_payload(home, args.size * 1024 ** 2, max(1, args.files))
+    torrent_info = make_torrent(lt, root, args.piece_size * 1024)
+
+    seeder = lt.session(loopback_settings(args.port))
+    params = lt.add_torrent_params()
+    params.ti = torrent_info
+    params.save_path = os.path.dirname(root)
+    seed = seeder.add_torrent(params)
+    if not wait_for(lambda: seed.status().is_seeding, args.timeout):
+        print("The seeder did not finish checking its files.", file=sys.stderr)
+        return 1
+
+    results = [
+        run_profile(lt, profile, torrent_info, args.port, directory, args.timeout)
+        for _ in range(args.repeat) for profile in profiles
+    ]
+    del seeder
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+    return 0 if all(result['finished'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -29,23 +29,192 @@ CACHE_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = CACHE_DIR / '.logs'
 HISTORY_FILE = CACHE_DIR / '.history'
 MOVIE_STORE_FILE = CACHE_DIR / 'movie_store.json'
+MOVIE_JOURNAL_FILE = CACHE_DIR / 'movie_store.journal.jsonl'
+MOVIE_DATABASE_FILE = CACHE_DIR / 'movie_store.db'
+HTTP_CACHE_DIR = CACHE_DIR / 'http'
+RESUME_DATA_DIR = CACHE_DIR / 'resume'
+TORRENT_METADATA_DIR = CACHE_DIR / 'torrents'
 
 # ─────────────────────────────────────────────
 # DEFAULTS & ENVIRONMENT CONFIGURATION
 # ─────────────────────────────────────────────
 
 # Base URL for torrent scraping
-TORRENT_BASE_URL = 'https://1337x.to'
+default_torrent_base_url = 'https://1337x.to'
+TORRENT_BASE_URL = os.environ.get('TORRENT_BASE_URL', default_torrent_base_url).rstrip('/')
+
+# Movie store backend (sqlite or json)
+default_movie_store_backend = 'sqlite'
+MOVIE_STORE_BACKEND = os.environ.get('MOVIE_STORE_BACKEND', default_movie_store_backend).lower()
+
+# Number of journal entries after which the JSON movie store snapshot is rewritten
+default_movie_journal_compact_threshold = 200
+MOVIE_JOURNAL_COMPACT_THRESHOLD = int(os.environ.get('MOVIE_JOURNAL_COMPACT_THRESHOLD', default_movie_journal_compact_threshold))
+
+# Lazy movie store (only an index is read at startup, with a bounded number of movies kept in memory)
+MOVIE_STORE_LAZY = os.environ.get('MOVIE_STORE_LAZY', 'false').lower() in ('1', 'true', 'yes')
+
+default_movie_cache_size = 256
+MOVIE_CACHE_SIZE = int(os.environ.get('MOVIE_CACHE_SIZE', default_movie_cache_size))
 
 # Search depth (how many pages to crawl)
 default_search_depth = 2
 TORRENT_SEARCH_DEPTH = int(os.environ.get('TORRENT_FILES_PER_MOVIE', default_search_depth))
 
+# Number of torrent pages fetched in parallel for each movie
+default_torrent_fetch_workers = 4
+TORRENT_FETCH_WORKERS = int(os.environ.get('TORRENT_FETCH_WORKERS', default_torrent_fetch_workers))
+
 # Supported languages
 default_languages = 'English, Spanish'
 TORRENT_SUPPORTED_LANGUAGES = os.environ.get('TORRENT_SUPPORTED_LANGUAGES', default_languages).replace(' ', '').split(',')
 TORRENT_SUPPORTED_LANGUAGES = [lang.capitalize() for lang in TORRENT_SUPPORTED_LANGUAGES]
 
+# Crawl concurrency (worker threads and simultaneous requests per host)
+default_crawl_workers = 8
+CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', default_crawl_workers))
+
+default_crawl_host_concurrency = 4
+CRAWL_HOST_CONCURRENCY = int(os.environ.get('CRAWL_HOST_CONCURRENCY', default_crawl_host_concurrency))
+
+# Number of movies built in parallel once their links have been found
+default_hydration_workers = 4
+HYDRATION_WORKERS = int(os.environ.get('HYDRATION_WORKERS', default_hydration_workers))
+
+# Batch search (titles crawled at once and movies stored per commit)
+default_batch_search_workers = 4
+BATCH_SEARCH_WORKERS = int(os.environ.get('BATCH_SEARCH_WORKERS', default_batch_search_workers))
+
+default_batch_commit_size = 50
+BATCH_COMMIT_SIZE = int(os.environ.get('BATCH_COMMIT_SIZE', default_batch_commit_size))
+
+# HTTP client settings (deadline in seconds, keep-alive pool sizes and idle expiry in seconds)
+default_http_request_deadline = 10
+HTTP_REQUEST_DEADLINE = float(os.environ.get('HTTP_REQUEST_DEADLINE', default_http_request_deadline))
+
+default_http_max_connections = 100
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', default_http_max_connections))
+
+default_http_max_keepalive_connections = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', default_http_max_keepalive_connections))
+
+default_http_keepalive_expiry = 30
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', default_http_keepalive_expiry))
+
+# Request throttling per host (requests per second, 0 to disable, and bounds of the adaptive concurrency limit)
+default_http_rate_limit = 10
+HTTP_RATE_LIMIT = float(os.environ.get('HTTP_RATE_LIMIT', default_http_rate_limit))
+
+default_http_rate_burst = 10
+HTTP_RATE_BURST = float(os.environ.get('HTTP_RATE_BURST', default_http_rate_burst))
+
+default_http_concurrency_min = 1
+HTTP_CONCURRENCY_MIN = int(os.environ.get('HTTP_CONCURRENCY_MIN', default_http_concurrency_min))
+
+default_http_concurrency_initial = 4
+HTTP_CONCURRENCY_INITIAL = int(os.environ.get('HTTP_CONCURRENCY_INITIAL', default_http_concurrency_initial))
+
+default_http_concurrency_max = 16
+HTTP_CONCURRENCY_MAX = int(os.environ.get('HTTP_CONCURRENCY_MAX', default_http_concurrency_max))
+
+# Retries of failed requests (delays in seconds, budget as a fraction of the requests sent)
+default_http_retry_attempts = 3
+HTTP_RETRY_ATTEMPTS = int(os.environ.get('HTTP_RETRY_ATTEMPTS', default_http_retry_attempts))
+
+default_http_retry_base_delay = 0.5
+HTTP_RETRY_BASE_DELAY = float(os.environ.get('HTTP_RETRY_BASE_DELAY', default_http_retry_base_delay))
+
+default_http_retry_max_delay = 10
+HTTP_RETRY_MAX_DELAY = float(os.environ.get('HTTP_RETRY_MAX_DELAY', default_http_retry_max_delay))
+
+default_http_retry_budget = 0.2
+HTTP_RETRY_BUDGET = float(os.environ.get('HTTP_RETRY_BUDGET', default_http_retry_budget))
+
+# Circuit breaker (consecutive failures before a host is paused, and seconds it stays paused)
+default_http_circuit_failures = 5
+HTTP_CIRCUIT_FAILURES = int(os.environ.get('HTTP_CIRCUIT_FAILURES', default_http_circuit_failures))
+
+default_http_circuit_reset_timeout = 30
+HTTP_CIRCUIT_RESET_TIMEOUT = float(os.environ.get('HTTP_CIRCUIT_RESET_TIMEOUT', default_http_circuit_reset_timeout))
+
+# Pages and parsed results kept in memory for the duration of a search
+default_search_memo_size = 1024
+SEARCH_MEMO_SIZE = int(os.environ.get('SEARCH_MEMO_SIZE', default_search_memo_size))
+
+# HTTP response cache (size limit in megabytes and time to live in seconds for each page type)
+HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+default_http_cache_max_size = 200
+HTTP_CACHE_MAX_SIZE = int(float(os.environ.get('HTTP_CACHE_MAX_SIZE', default_http_cache_max_size)) * 1024 * 1024)
+
+default_http_cache_ttl_search = 10 * 60
+HTTP_CACHE_TTL_SEARCH = float(os.environ.get('HTTP_CACHE_TTL_SEARCH', default_http_cache_ttl_search))
+
+default_http_cache_ttl_movie = 6 * 60 * 60
+HTTP_CACHE_TTL_MOVIE = float(os.environ.get('HTTP_CACHE_TTL_MOVIE', default_http_cache_ttl_movie))
+
+default_http_cache_ttl_torrent = 7 * 24 * 60 * 60
+HTTP_CACHE_TTL_TORRENT = float(os.environ.get('HTTP_CACHE_TTL_TORRENT', default_http_cache_ttl_torrent))
+
+default_http_cache_ttl_default = 60 * 60
+HTTP_CACHE_TTL_DEFAULT = float(os.environ.get('HTTP_CACHE_TTL_DEFAULT', default_http_cache_ttl_default))
+
+# HTML parser backend (auto, lxml or html.parser)
+default_html_parser = 'auto'
+HTML_PARSER = os.environ.get('HTML_PARSER', default_html_parser).lower()
+
+# Download manager (downloads running at once, rate limits in KiB/s with 0 for no limit, and listening port)
+default_download_max_active = 3
+DOWNLOAD_MAX_ACTIVE = int(os.environ.get('DOWNLOAD_MAX_ACTIVE', default_download_max_active))
+
+default_download_rate_limit = 0
+DOWNLOAD_RATE_LIMIT = float(os.environ.get('DOWNLOAD_RATE_LIMIT', default_download_rate_limit))
+
+default_download_upload_rate_limit = 0
+DOWNLOAD_UPLOAD_RATE_LIMIT = float(os.environ.get('DOWNLOAD_UPLOAD_RATE_LIMIT', default_download_upload_rate_limit))
+
+default_download_torrent_rate_limit = 0
+DOWNLOAD_TORRENT_RATE_LIMIT = float(os.environ.get('DOWNLOAD_TORRENT_RATE_LIMIT', default_download_torrent_rate_limit))
+
+default_download_torrent_upload_rate_limit = 0
+DOWNLOAD_TORRENT_UPLOAD_RATE_LIMIT = float(os.environ.get('DOWNLOAD_TORRENT_UPLOAD_RATE_LIMIT', default_download_torrent_upload_rate_limit))
+
+default_download_listen_port = 6881
+DOWNLOAD_LISTEN_PORT = int(os.environ.get('DOWNLOAD_LISTEN_PORT', default_download_listen_port))
+
+# Seconds between two saves of the resume data of unfinished downloads
+default_download_resume_interval = 30
+DOWNLOAD_RESUME_INTERVAL = float(os.environ.get('DOWNLOAD_RESUME_INTERVAL', default_download_resume_interval))
+
+# Session profile tuning the connections, disk threads and buffers and the file allocation of the torrent session
+# (default, high-throughput, low-memory, ssd or hdd)
+default_download_profile = 'default'
+DOWNLOAD_PROFILE = os.environ.get('DOWNLOAD_PROFILE', default_download_profile)
+
+# File selection (comma-separated patterns of the files to download and to skip, minimum file size in MB, and whether
+# only the movie itself is downloaded)
+default_download_include = ''
+DOWNLOAD_INCLUDE = [pattern.strip() for pattern in os.environ.get('DOWNLOAD_INCLUDE', default_download_include).split(',') if pattern.strip()]
+
+default_download_exclude = ''
+DOWNLOAD_EXCLUDE = [pattern.strip() for pattern in os.environ.get('DOWNLOAD_EXCLUDE', default_download_exclude).split(',') if pattern.strip()]
+
+default_download_min_file_size = 0
+DOWNLOAD_MIN_FILE_SIZE = float(os.environ.get('DOWNLOAD_MIN_FILE_SIZE', default_download_min_file_size))
+
+DOWNLOAD_LARGEST_VIDEO_ONLY = os.environ.get('DOWNLOAD_LARGEST_VIDEO_ONLY', 'false').lower() in ('1', 'true', 'yes')
+
+# Streaming (number of pieces after the playhead of a streamed video that are requested with a deadline)
+default_streaming_window = 16
+STREAMING_WINDOW = int(os.environ.get('STREAMING_WINDOW', default_streaming_window))
+
+# Torrent selection (seconds the swarms of the candidates are probed, 0 to take the most seeded, and number of candidates)
+default_selection_probe_seconds = 10
+SELECTION_PROBE_SECONDS = float(os.environ.get('SELECTION_PROBE_SECONDS', default_selection_probe_seconds))
+
+default_selection_candidates = 3
+SELECTION_CANDIDATES = int(os.environ.get('SELECTION_CANDIDATES', default_selection_candidates))
+
 # Chrome binary path
 CHROME_BINARY = '/usr/bin/chromium'
 
@@ -53,6 +222,16 @@ CHROME_BINARY = '/usr/bin/chromium'
 default_load_strategy = 'normal'
 SELENIUM_LOAD_STRATEGY = os.environ.get("SELENIUM_LOAD_STRATEGY", default_load_strategy)
 
+# Selenium browser pool (maximum browsers, idle seconds before shutdown and pages loaded before a restart)
+default_selenium_pool_size = 2
+SELENIUM_POOL_SIZE = int(os.environ.get("SELENIUM_POOL_SIZE", default_selenium_pool_size))
+
+default_selenium_idle_timeout = 300
+SELENIUM_IDLE_TIMEOUT = float(os.environ.get("SELENIUM_IDLE_TIMEOUT", default_selenium_idle_timeout))
+
+default_selenium_max_pages = 50
+SELENIUM_MAX_PAGES = int(os.environ.get("SELENIUM_MAX_PAGES", default_selenium_max_pages))
+
 # Terminal display settings
 default_terminal_width = 150
 TERMINAL_WIDTH = int(os.environ.get("TERMINAL_WIDTH", default_terminal_width))
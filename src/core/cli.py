@@ -15,16 +15,6 @@ from src.constants import TERMINAL_WIDTH, HISTORY_FILE
 
 console = Console(force_terminal=True, width=TERMINAL_WIDTH)
 
-# Load previous history
-if os.path.exists(HISTORY_FILE):
-    readline.read_history_file(HISTORY_FILE)
-else:
-    with open(HISTORY_FILE, 'w') as f:
-        pass
-
-# Save history on exit
-atexit.register(readline.write_history_file, HISTORY_FILE)
-
 # Set the spacing for the help text.
 FIRST_COLUMN_WIDTH = 16
 SECOND_COLUMN_WIDTH = 12
@@ -34,6 +24,9 @@ class CLI:
     def __init__(self):
         self.commands = {}
 
+        # Whether commands are read from the prompt, rather than run one at a time from the command line
+        self.interactive = False
+
         self.global_options = [
             ("-h, --help", "Display help for the given command."),
         ]
@@ -57,6 +50,9 @@ class CLI:
         return decorator
 
     def start(self):
+        self.interactive = True
+        self.load_history()
+
         console.print("[dim]Welcome to the search automation and content download CLI[/dim]. Type 'help' to see available commands. Type 'exit' to quit.")
         while True:
             try:
@@ -74,71 +70,100 @@ class CLI:
                         live.update(Text(f"Shutdown successfully!", style='yellow'))
                         break
 
-                if raw_input.lower() == 'help':
-                    self.print_help()
-                    continue
+                self.execute(shlex.split(raw_input))
+            except Exception as e:
+                console.print(f"[red]An error occurred:[/red] {e}")
 
-                parts = shlex.split(raw_input)
-                cmd_name = parts[0]
-                args_and_kwargs = parts[1:]
+    @staticmethod
+    def load_history():
+        # Load previous history
+        if os.path.exists(HISTORY_FILE):
+            readline.read_history_file(HISTORY_FILE)
+        else:
+            with open(HISTORY_FILE, 'w') as f:
+                pass
 
-                if cmd_name not in self.commands:
-                    console.print(f"[red]'{cmd_name}' is not a recognized command.[/red]")
-                    continue
+        # Save history on exit
+        atexit.register(readline.write_history_file, HISTORY_FILE)
 
-                if len(args_and_kwargs) == 1 and args_and_kwargs[0] in ("-h", "--help"):
-                    self.print_command_help(cmd_name)
-                    continue
+    def run(self, argv: list[str]) -> int:
+        """
+        Runs a single command without entering the interactive prompt.
 
-                cmd_info = self.commands[cmd_name]
-                expected_args = cmd_info["args"]
-                expected_kwargs = cmd_info["kwargs"]
-
-                positional = []
-                kwargs = {}
-                i = 0
-
-                while i < len(args_and_kwargs):
-                    part = args_and_kwargs[i]
-                    if part.startswith("-"):
-                        if part not in expected_kwargs:
-                            console.print(f"[red]Unknown keyword argument '{part}'[/red]")
-                            break
-
-                        key = expected_kwargs[part][0]  # canonical name
-                        is_expecting_arg = True
-
-                        for kwarg, cmd in expected_kwargs.items():
-                            if key == kwarg.replace("-", ""):
-                                is_expecting_arg = cmd[2] is not None
-
-                        if is_expecting_arg and i + 1 >= len(args_and_kwargs):
-                            console.print(f"[red]Missing value for keyword argument '{part}'[/red]")
-                            break
-
-                        value = args_and_kwargs[i + 1] if is_expecting_arg else None
-
-                        if not value:
-                            kwargs[key] = True
-                            i += 1
-                        elif not value.startswith("-"):
-                            kwargs[key] = value
-                            i += 2
-                        else:
-                            console.print(f"[red]Expected a value for '{part}' but got another flag.[/red]")
-                            break
-                    else:
-                        positional.append(part)
-                        i += 1
-
-                if len(positional) != len(expected_args):
-                    arg_list = ', '.join(name for name, _ in expected_args)
-                    console.print(f"[red]'{cmd_name}' expects {len(expected_args)} positional arguments: {arg_list}[/red]")
-                    continue
+        :param argv: Command name followed by its arguments, e.g. `sys.argv[1:]`.
+        :return: Exit code, 0 if the command succeeded.
+        """
+        try:
+            return 0 if self.execute(argv) else 1
+        except Exception as e:
+            console.print(f"[red]An error occurred:[/red] {e}")
+            return 1
 
-                cmd_info["func"](*positional, **kwargs)
-            except Exception as e:
-                console.print(f"[red]An error occurred:[/red] {e}")
+    def execute(self, parts: list[str]) -> bool:
+        """
+        Parses the arguments of a command and calls it.
+
+        :param parts: Command name followed by its arguments.
+        :return: Whether the command was found, its arguments were valid and it did not report a failure.
+        """
+        if not parts or parts[0].lower() == 'help':
+            self.print_help()
+            return bool(parts)
+
+        cmd_name = parts[0]
+        args_and_kwargs = parts[1:]
+
+        if cmd_name not in self.commands:
+            console.print(f"[red]'{cmd_name}' is not a recognized command.[/red]")
+            return False
+
+        if len(args_and_kwargs) == 1 and args_and_kwargs[0] in ("-h", "--help"):
+            self.print_command_help(cmd_name)
+            return True
+
+        cmd_info = self.commands[cmd_name]
+        expected_args = cmd_info["args"]
+        expected_kwargs = cmd_info["kwargs"]
+
+        positional = []
+        kwargs = {}
+        i = 0
+
+        while i < len(args_and_kwargs):
+            part = args_and_kwargs[i]
+            if part.startswith("-"):
+                if part not in expected_kwargs:
+                    console.print(f"[red]Unknown keyword argument '{part}'[/red]")
+                    return False
+
+                key = expected_kwargs[part][0]  # canonical name
+                is_expecting_arg = expected_kwargs[part][2] is not None
+
+                if is_expecting_arg and i + 1 >= len(args_and_kwargs):
+                    console.print(f"[red]Missing value for keyword argument '{part}'[/red]")
+                    return False
+
+                value = args_and_kwargs[i + 1] if is_expecting_arg else None
+
+                if not value:
+                    kwargs[key] = True
+                    i += 1
+                elif not value.startswith("-"):
+                    kwargs[key] = value
+                    i += 2
+                else:
+                    console.print(f"[red]Expected a value for '{part}' but got another flag.[/red]")
+                    return False
+            else:
+                positional.append(part)
+                i += 1
+
+        if len(positional) != len(expected_args):
+            arg_list = ', '.join(name for name, _ in expected_args)
+            console.print(f"[red]'{cmd_name}' expects {len(expected_args)} positional arguments: {arg_list}[/red]")
+            return False
+
+        return cmd_info["func"](*positional, **kwargs) is not False
 
     def print_help(self):
         console.print("[bold]Usage:[/bold]")
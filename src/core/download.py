@@ -1,108 +1,921 @@
 import asyncio
+import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Optional, Callable
+
 import libtorrent as lt
 
-from rich.live import Live
 from rich.progress import Progress, TextColumn, SpinnerColumn, BarColumn, TimeElapsedColumn
-from rich.spinner import Spinner
+from rich.table import Table
 from rich.text import Text
-from torrentp import Downloader, TorrentDownloader, TorrentInfo
+from torrentp import Downloader, Session, TorrentInfo
 
+from src.constants import (
+    TORRENT_DOWNLOAD_PATH, DOWNLOAD_MAX_ACTIVE, DOWNLOAD_RATE_LIMIT, DOWNLOAD_UPLOAD_RATE_LIMIT,
+    DOWNLOAD_TORRENT_RATE_LIMIT, DOWNLOAD_TORRENT_UPLOAD_RATE_LIMIT, DOWNLOAD_LISTEN_PORT, DOWNLOAD_RESUME_INTERVAL,
+    RESUME_DATA_DIR, TORRENT_METADATA_DIR, STREAMING_WINDOW, DASH_HEAD
+)
 from src.core.cli import console
+from src.core.files import TorrentFile, FileFilter, list_files, main_video
+from src.core.tuning import SessionProfile, get_profile
+from src.utils.requests import requests
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two requests for the status of the torrents that changed, delivered as a state update alert
+UPDATE_INTERVAL = 1
+
+# Seconds to wait at shutdown for the session to hand over the resume data of every download
+RESUME_SAVE_TIMEOUT = 10
+
+# Key of the resume data under which the settings of a download that libtorrent knows nothing about are kept
+RESUME_SETTINGS_KEY = b'py-torrent-crawler'
+
+# Milliseconds between the deadlines of two consecutive pieces of a streamed video
+STREAMING_DEADLINE_STEP = 250
+
+# File priorities understood by libtorrent
+DONT_DOWNLOAD = 0
+DEFAULT_PRIORITY = 4
+
+
+class Stream:
+    """
+    Sequential download of the main video of a torrent, so it can be played while the rest is still downloading.
+
+    The playhead is the end of the part of the video that is already on disk. The pieces right after it get deadlines
+    one after the other, as does the last piece of the video since players read the index of some containers from
+    there, and the window moves forward as pieces arrive. Samples and extras are only queued once the window reaches
+    the end of the video: sequential downloads ignore lower priorities, so they are skipped until then rather than
+    deprioritized.
+    """
+
+    def __init__(self, handle, window: int = STREAMING_WINDOW):
+        self._handle = handle
+        self._window = max(1, window)
+        self._lock = threading.Lock()
+
+        self.file: Optional[TorrentFile] = None
+        self._first_piece = self._last_piece = self._playhead = 0
+        self._piece_length = 0
+        self._deadlines: set[int] = set()
+        self._held_back: dict[int, tuple[TorrentFile, int]] = {}
+        self._extras: list[TorrentFile] = []
+
+        # Set before the metadata arrives, otherwise the first pieces requested are picked rarest first
+        self._handle.set_flags(lt.torrent_flags.sequential_download)
+
+    @property
+    def ready_bytes(self) -> int:
+        """
+        Bytes at the start of the video that can be played.
+        """
+        if self.file is None:
+            return 0
+        end = self._playhead * self._piece_length
+        return max(0, min(self.file.offset + self.file.size, end) - self.file.offset)
+
+    def prepare(self, torrent_info, files: list[TorrentFile], priorities: list[int]) -> bool:
+        """
+        Finds the video among the files that are downloaded once the metadata of the torrent is known, and holds back
+        the samples and extras in the given file priorities.
+
+        :return: Whether the torrent has a video to stream.
+        """
+        with self._lock:
+            if self.file is None:
+                video = main_video([file for file in files if priorities[file.index] != DONT_DOWNLOAD])
+                if video is None:
+                    logger.warning(f"No video to stream in {torrent_info.name()}, downloading it as usual.")
+                    return False
+
+                self._held_back = {
+                    file.index: (file, DONT_DOWNLOAD) for file in files
+                    if file.index != video.index and file.is_extra and priorities[file.index] != DONT_DOWNLOAD
+                }
+                self._piece_length = torrent_info.piece_length()
+                self._first_piece = torrent_info.map_file(video.index, 0, 1).piece
+                self._last_piece = torrent_info.map_file(video.index, max(0, video.size - 1), 1).piece
+                self._playhead = self._first_piece
+                self.file = video
+                logger.info(f"Streaming {video.path}.")
+
+            # Files still held back keep the priority they were given last, to be restored once released
+            for index, (file, _) in self._held_back.items():
+                self._held_back[index] = (file, priorities[index])
+                priorities[index] = DONT_DOWNLOAD
+            return True
+
+    def update(self):
+        """
+        Moves the playhead past the pieces received since the last update and gives deadlines to the new pieces of
+        the window.
+        """
+        with self._lock:
+            if self.file is None:
+                return
+
+            while self._playhead <= self._last_piece and self._handle.have_piece(self._playhead):
+                self._deadlines.discard(self._playhead)
+                self._playhead += 1
+
+            window = range(self._playhead, min(self._playhead + self._window, self._last_piece + 1))
+            if self._playhead + self._window > self._last_piece:
+                # Queued before the torrent finishes, which would close the connections to the seeders
+                self._release_extras()
+
+            pieces = [*window, self._last_piece] if self._last_piece not in window else list(window)
+            for position, piece in enumerate(pieces):
+                if piece not in self._deadlines and not self._handle.have_piece(piece):
+                    self._handle.set_piece_deadline(piece, (position + 1) * STREAMING_DEADLINE_STEP)
+                    self._deadlines.add(piece)
+
+    def extras_downloaded(self) -> bool:
+        """
+        Whether the samples and extras are downloaded, queuing them if they were still held back. The status of the
+        torrent is not enough, since it only takes new file priorities into account once they reach the disk.
+        """
+        with self._lock:
+            self._release_extras()
+            if not self._extras:
+                return True
+            progress = self._handle.file_progress()
+            return all(progress[file.index] >= file.size for file in self._extras)
+
+    def _release_extras(self):
+        if not self._held_back:
+            return
+
+        priorities = self._handle.get_file_priorities()
+        for file, priority in self._held_back.values():
+            priorities[file.index] = priority
+            if priority != DONT_DOWNLOAD:
+                self._extras.append(file)
+        self._handle.prioritize_files(priorities)
+        self._held_back.clear()
 
 
 class DownloaderWrapper(Downloader):
+    """
+    Download on the session of a `DownloadManager`, whose status is kept up to date by the alerts of the session.
+    """
+
+    def __init__(self, *args, download_id: int = None, title: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.id = download_id
+        self.title = title
+        self.announced = False
+        self.stream: Optional[Stream] = None
+        self.file_filter: Optional[FileFilter] = None
+        self.selected_bytes: Optional[int] = None
+        self._removed = False
+        self._listeners: list[Callable[[str], None]] = []
+
+    def status(self):
+        # The torrent is added to the shared session once, and its metadata is waited for by the progress display
+        if self._removed:
+            return self._status
+        if self._file is None:
+            self._file = self._session.add_torrent(self._torrent_info)
+        self._status = self._file.status()
+        return self._status
+
+    @property
+    def name(self):
+        return (self._status or self.status()).name or self.title or ''
+
+    @property
+    def info_hash(self) -> str:
+        return str((self._status or self.status()).info_hashes.get_best())
+
+    @property
+    def handle(self):
+        self.status()
+        return self._file
+
+    @property
+    def wanted_bytes(self) -> int:
+        # The status only counts new file priorities once they have reached the disk
+        if self.selected_bytes is not None:
+            return self.selected_bytes
+        return self.status().total_wanted
+
+    @property
+    def is_finished(self) -> bool:
+        return self.announced
+
+    @property
+    def stop_after_download(self) -> bool:
+        return self._stop_after_download
+
+    def set_limits(self, download_speed=0, upload_speed=0):
+        """
+        Caps the rates of this torrent, in KiB/s, on top of the session limits. Zero means no limit.
+        """
+        self.status()
+        self._file.set_download_limit(int(download_speed * 1024) if download_speed > 0 else -1)
+        self._file.set_upload_limit(int(upload_speed * 1024) if upload_speed > 0 else -1)
+
+    def add_listener(self, listener: Callable[[str], None]):
+        """
+        Registers a function called from the thread of the download manager on every event of this download:
+        `state` when its status is updated, `metadata` when its metadata is received and `finished` once downloaded.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str], None]):
+        self._listeners.remove(listener)
+
+    def notify(self, event: str, status=None):
+        if status is not None:
+            self._status = status
+        for listener in list(self._listeners):
+            listener(event)
+
     async def download(self):
-        await self.get_size_info(self.status().total_wanted)
-
-        with Progress(
-                TextColumn("{task.fields[status]}"),
-                SpinnerColumn(),
-                BarColumn(complete_style="green"),
-                TextColumn("{task.completed}%", style="progress.completed"),
-                TimeElapsedColumn(),
-                TextColumn("{task.fields[download]} Kb/s", style="dim"),
-                TextColumn("{task.fields[peers]} peers", style='dim'),
-                console=console,
-                transient=True,
-        ) as progress:
-            fields = {'percentage': 0, 'status': 'Starting', 'peers': 0, 'download': 0, 'upload': 0}
-            task = progress.add_task("Downloading movie", total=100, **fields)
-
-            while not self._status.is_seeding:
-                if not self._paused:
-                    fields = self._get_status_progress(self.status())
+        """
+        Displays the progress of the download until it has finished, redrawing it on every update of its status.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue[str] = asyncio.Queue()
+
+        def listener(event: str):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        self.add_listener(listener)
+        try:
+            self.get_size_info(self.wanted_bytes)
+
+            with Progress(
+                    TextColumn("{task.fields[status]}"),
+                    SpinnerColumn(),
+                    BarColumn(complete_style="green"),
+                    TextColumn("{task.completed}%", style="progress.completed"),
+                    TimeElapsedColumn(),
+                    TextColumn("{task.fields[download]} Kb/s", style="dim"),
+                    TextColumn("{task.fields[peers]} peers", style='dim'),
+                    TextColumn("{task.fields[ready]}", style='dim'),
+                    console=console,
+                    transient=True,
+            ) as progress:
+                fields = self._get_status_progress(self._status)
+                task = progress.add_task("Downloading movie", total=100, **fields)
+
+                while not self.announced:
+                    event = await events.get()
+                    if event == 'metadata':
+                        self.get_size_info(self.wanted_bytes)
+
+                    fields = self._get_status_progress(self._status)
                     progress.update(task, completed=fields['percentage'], **fields)
-                await asyncio.sleep(1)
+        finally:
+            self.remove_listener(listener)
 
-        if self._stop_after_download:
-            self.stop()
-        else:
-            with Live(console=console, transient=False) as live:
-                live.update(Text(f"Downloaded successfully!", style='green'))
-                await asyncio.sleep(2)
+        console.print(Text("Downloaded successfully!", style='green'))
+
+    def progress(self) -> dict:
+        return self._get_status_progress(self._status or self.status())
 
     def _get_status_progress(self, s):
+        if self._paused:
+            status = 'Paused'
+        elif s.paused:
+            # Auto-managed torrents are paused by the session until a download slot is free
+            status = 'Queued'
+        else:
+            status = 'Seeding' if s.is_seeding else str(s.state).capitalize()
+
         fields = {
             'percentage': round(s.progress * 100),
-            'status': str(s.state).capitalize() if s.num_peers > 0 else 'Seeding',
+            'status': status,
             'peers': s.num_peers,
             'download': round(s.download_rate / 1000, 2),
-            "upload": round(s.upload_rate / 1000, 2)
+            "upload": round(s.upload_rate / 1000, 2),
+            'ready': self._get_ready_info(),
         }
 
         return fields
 
-    async def get_size_info(self, byte_length):
-        with Live(console=console, transient=True) as live:
-            live.update(Spinner(name='dots', text="Getting file info...", style='green'))
-            await asyncio.sleep(2)
-
-            if not self._is_magnet:
-                _file_size = byte_length / 1000
-                _size_info = 'Size: %.2f ' % _file_size
-                _size_info += 'MB' if _file_size > 1000 else 'KB'
-                live.update(Text(f"The file has a size of {_size_info}", style='green'))
-                await asyncio.sleep(2)
-
-            if self.status().name:
-                live.update(Text(f"Saving as '{self.status().name}'...", style='green'))
-                await asyncio.sleep(2)
-
-    # def pause(self):
-    #     console.print("[yellow]Pausing download..[/yellow]")
-    #     self.pause()
-    #     console.print("[yellow]Download paused successfully.[/yellow]")
-
-    # def resume(self):
-    #     console.print("[yellow]Resuming download..[/yellow]")
-    #     self.resume()
-    #     console.print("[yellow]Download resumed successfully.[/yellow]")
-
-    # def stop(self):
-    #     console.print("[red]Stopping download..[/red]")
-    #     self.stop()
-    #     console.print("[red]Download stopped successfully.[/red]")
-
-class TorrentDownloaderWrapper(TorrentDownloader):
-
-    async def start_download(self, download_speed=0, upload_speed=0):
-        if self._file_path.startswith('magnet:'):
-            self._add_torrent_params = self._lt.parse_magnet_uri(self._file_path)
-            self._add_torrent_params.save_path = self._save_path
-            self._downloader = DownloaderWrapper(
-                session=self._session(), torrent_info=self._add_torrent_params,
-                save_path=self._save_path, libtorrent=lt, is_magnet=True, stop_after_download=self._stop_after_download
-            )
+    def _get_ready_info(self) -> str:
+        if self.stream is None or self.stream.file is None:
+            return ''
+        return f"{self.stream.ready_bytes / 1000 ** 2:.1f} MB ready"
+
+    def get_size_info(self, byte_length):
+        # Magnet links only know the size and name of their files once the metadata has been received
+        if byte_length:
+            size = byte_length / 1000 ** 2
+            size_info = f"{size / 1000:.2f} GB" if size >= 1000 else f"{size:.2f} MB"
+            console.print(Text(f"The file has a size of {size_info}", style='green'))
+
+        if self._status.name:
+            console.print(Text(f"Saving as '{self._status.name}'...", style='green'))
+
+        if self.stream is not None and self.stream.file is not None:
+            path = os.path.join(self._status.save_path, self.stream.file.path)
+            console.print(Text(f"Streaming '{path}', it can be opened in a player as soon as some of it is ready.", style='green'))
+
+    def pause(self):
+        # Taken out of the session queue, otherwise the session would start it again
+        self.status()
+        self._file.unset_flags(lt.torrent_flags.auto_managed)
+        self._file.pause()
+        self._paused = True
+
+    def resume(self):
+        self.status()
+        self._file.set_flags(lt.torrent_flags.auto_managed)
+        self._file.resume()
+        self._paused = False
+
+    def stop(self, delete_files: bool = False):
+        if self._file:
+            self._session.remove_torrent(self._file, lt.session.delete_files if delete_files else 0)
+            self._file = None
+            self._removed = True
+
+    @classmethod
+    def print_details(cls, downloads):
+        table = Table(
+            header_style=None,
+            box=DASH_HEAD,
+            expand=True,
+            width=console.width,
+            padding=(0, 2),
+            pad_edge=False,
+            show_edge=False,
+        )
+
+        table.add_column("ID", min_width=4)
+        table.add_column("Name", no_wrap=True)
+        table.add_column("Status")
+        table.add_column("Progress", justify="right")
+        table.add_column("Down", justify="right")
+        table.add_column("Up", justify="right")
+        table.add_column("Peers", justify="right")
+        table.add_column("Stream", justify="right")
+
+        for download in downloads:
+            table = download.add_row(table)
+
+        console.print(table)
+
+    def add_row(self, table: Table) -> Table:
+        fields = self.progress()
+
+        table.add_row(
+            Text(str(self.id)),
+            Text(self.name or '-'),
+            Text(fields['status']),
+            Text(f"{fields['percentage']}%"),
+            Text(f"{fields['download']} Kb/s"),
+            Text(f"{fields['upload']} Kb/s"),
+            Text(str(fields['peers'])),
+            Text(fields['ready'] or '-'),
+        )
+
+        return table
+
+
+class ResumeDataStore:
+    """
+    Fast-resume data of the downloads, kept in one file per torrent named after its info hash.
+
+    A download restored from its resume data knows which pieces are already on disk, so they are not checked again,
+    and carries the torrent metadata once it has been received, so it is not requested from the swarm again. The
+    settings of the download itself, such as its file filter and streaming mode, are kept in the same file.
+    """
+
+    def __init__(self, directory: Path = RESUME_DATA_DIR):
+        self._directory = directory
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> list[tuple]:
+        """
+        :return: Add torrent params of every saved download, along with its settings.
+        """
+        saved = []
+        for path in sorted(self._directory.glob('*.fastresume')):
+            try:
+                data = path.read_bytes()
+                params = lt.read_resume_data(data)
+                settings = lt.bdecode(data).get(RESUME_SETTINGS_KEY)
+                saved.append((params, json.loads(settings) if settings else {}))
+            except (RuntimeError, OSError, ValueError) as e:
+                logger.warning(f"Discarding unreadable resume data {path.name}: {e}")
+                path.unlink(missing_ok=True)
+        return saved
+
+    def save(self, params, settings: dict = None):
+        entry = lt.write_resume_data(params)
+        if settings:
+            entry[RESUME_SETTINGS_KEY] = json.dumps(settings).encode('utf-8')
+
+        path = self._path(str(params.info_hashes.get_best()))
+        temporary_path = path.with_suffix('.tmp')
+        temporary_path.write_bytes(lt.bencode(entry))
+        os.replace(temporary_path, path)
+
+    def remove(self, info_hash: str):
+        self._path(info_hash).unlink(missing_ok=True)
+
+    def _path(self, info_hash: str) -> Path:
+        return self._directory / f"{info_hash}.fastresume"
+
+
+class MetadataCache:
+    """
+    Torrent files kept by info hash, so magnet links of known torrents start without asking the swarm for metadata.
+
+    Torrent files are downloaded from the links scraped with the torrent, or written once the metadata of a magnet
+    link has been received from peers.
+    """
 
+    def __init__(self, directory: Path = TORRENT_METADATA_DIR):
+        self._directory = directory
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, info_hash: str):
+        path = self._path(info_hash)
+        if not path.exists():
+            return None
+
+        try:
+            return lt.torrent_info(str(path))
+        except RuntimeError as e:
+            logger.warning(f"Discarding unreadable torrent file {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def fetch(self, info_hash: str, links: list[str]):
+        """
+        Downloads the torrent file from the first link serving the torrent with the given info hash.
+
+        :return: Torrent info, or None if no link served it.
+        """
+        for link in links:
+            data = requests.fetch_bytes(link)
+            if not data:
+                continue
+
+            try:
+                torrent_info = lt.torrent_info(lt.bdecode(data))
+            except (RuntimeError, TypeError) as e:
+                logger.debug(f"{link} did not serve a torrent file: {e}")
+                continue
+
+            if str(torrent_info.info_hashes().get_best()) != info_hash:
+                logger.warning(f"{link} served another torrent than {info_hash}.")
+                continue
+
+            self._write(info_hash, data)
+            return torrent_info
+
+        return None
+
+    def put(self, torrent_info):
+        self._write(str(torrent_info.info_hashes().get_best()), lt.bencode(lt.create_torrent(torrent_info).generate()))
+
+    def _write(self, info_hash: str, data: bytes):
+        path = self._path(info_hash)
+        temporary_path = path.with_suffix('.tmp')
+        temporary_path.write_bytes(data)
+        os.replace(temporary_path, path)
+        logger.debug(f"Cached the metadata of {info_hash}.")
+
+    def _path(self, info_hash: str) -> Path:
+        return self._directory / f"{info_hash}.torrent"
+
+
+class DownloadManager:
+    """
+    Queue of downloads sharing one long-lived libtorrent session.
+
+    Torrents are added as auto-managed, so the session starts the first ones in the queue up to the number of active
+    downloads, and the next one as soon as a slot is free. A background thread follows their progress, which lets
+    commands return as soon as a torrent is queued.
+
+    The resume data of unfinished downloads is saved at a regular interval and at shutdown, and the downloads are
+    restored from it when the session starts again. The metadata of every torrent is cached as well, so a magnet link
+    downloaded again does not wait for the swarm.
+    """
+
+    def __init__(
+            self,
+            save_path=TORRENT_DOWNLOAD_PATH,
+            max_active: int = DOWNLOAD_MAX_ACTIVE,
+            download_limit: float = DOWNLOAD_RATE_LIMIT,
+            upload_limit: float = DOWNLOAD_UPLOAD_RATE_LIMIT,
+            torrent_download_limit: float = DOWNLOAD_TORRENT_RATE_LIMIT,
+            torrent_upload_limit: float = DOWNLOAD_TORRENT_UPLOAD_RATE_LIMIT,
+            port: int = DOWNLOAD_LISTEN_PORT,
+            resume_data: Optional[ResumeDataStore] = None,
+            resume_interval: float = DOWNLOAD_RESUME_INTERVAL,
+            metadata: Optional[MetadataCache] = None,
+            file_filter: Optional[FileFilter] = None,
+            profile: Optional[SessionProfile] = None
+    ):
+        self._save_path = str(save_path)
+        self._max_active = max(1, max_active)
+        self._download_limit = download_limit
+        self._upload_limit = upload_limit
+        self._torrent_download_limit = torrent_download_limit
+        self._torrent_upload_limit = torrent_upload_limit
+
+        self._session = Session(lt, port=port)
+        self._lt_session = None
+
+        self._resume_data = resume_data or ResumeDataStore()
+        self._resume_interval = resume_interval
+        self._pending_saves = 0
+
+        self._metadata = metadata or MetadataCache()
+        self._file_filter = file_filter or FileFilter()
+        self._profile = profile or get_profile()
+
+        self._ids = itertools.count(1)
+        self._downloads: dict[int, DownloaderWrapper] = {}
+        self._by_hash: dict[str, DownloaderWrapper] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+        atexit.register(self.close)
+
+    @property
+    def save_path(self) -> str:
+        return self._save_path
+
+    @property
+    def downloads(self) -> list[DownloaderWrapper]:
+        with self._lock:
+            return list(self._downloads.values())
+
+    def get(self, download_id: int) -> Optional[DownloaderWrapper]:
+        with self._lock:
+            return self._downloads.get(download_id)
+
+    def start(self):
+        """
+        Creates the session and starts the background thread, unless they are already running.
+        """
+        with self._lock:
+            if self._lt_session is not None:
+                return
+
+            self._lt_session = self._session()
+            self._profile.apply(self._lt_session)
+            logger.debug(f"Using the {self._profile.name} session profile.")
+            settings = self._lt_session.get_settings()
+            self._lt_session.apply_settings({
+                'active_downloads': self._max_active,
+                'active_limit': max(settings['active_limit'], self._max_active),
+                'alert_mask': (
+                    settings['alert_mask'] | lt.alert_category.status | lt.alert_category.storage
+                    | lt.alert_category.piece_progress
+                ),
+            })
+            self._session.set_download_limit(self._download_limit)
+            self._session.set_upload_limit(self._upload_limit)
+
+        for params, settings in self._resume_data.load():
+            params.save_path = params.save_path or self._save_path
+            download = self._register(params, title=settings.get('title') or params.name or None)
+            # A download paused by the user was taken out of the queue and stays paused
+            download._paused = not (params.flags & lt.torrent_flags.auto_managed) and bool(params.flags & lt.torrent_flags.paused)
+            if settings.get('file_filter') is not None:
+                download.file_filter = FileFilter(**settings['file_filter'])
+            if settings.get('stream'):
+                download.stream = Stream(download.handle)
+            self._select_files(download)
+            logger.info(f"Restored download {download.id}: {download.name}")
+
+        with self._lock:
+            self._thread = threading.Thread(target=self._monitor, name="downloads", daemon=True)
+            self._thread.start()
+
+    def add(
+            self,
+            source: str,
+            title: str = None,
+            torrent_links: list[str] = None,
+            stop_after_download: bool = False,
+            queued: bool = True,
+            save_path: str = None
+    ) -> DownloaderWrapper:
+        """
+        Queues a download.
+
+        :param source: Magnet link or path of a .torrent file.
+        :param title: Name displayed until the torrent metadata is known.
+        :param torrent_links: Links to the torrent file of a magnet link, downloaded if its metadata is not cached.
+        :param stop_after_download: Remove the torrent from the session once downloaded, instead of seeding it.
+        :param queued: Wait for a free download slot, otherwise the download starts right away.
+        :param save_path: Directory the files are saved to, instead of the download directory.
+        :return: Queued download, or the download of the same torrent if it is already in the queue.
+        """
+        self.start()
+
+        if source.startswith('magnet:'):
+            params = lt.parse_magnet_uri(source)
+            info_hash = str(params.info_hashes.get_best())
         else:
-            self._torrent_info = TorrentInfo(self._file_path, self._lt)
-            self._downloader = DownloaderWrapper(
-                session=self._session(), torrent_info=self._torrent_info(),
-                save_path=self._save_path, libtorrent=None, is_magnet=False, stop_after_download=self._stop_after_download
-            )
+            params = lt.add_torrent_params()
+            params.ti = TorrentInfo(source, lt)()
+            info_hash = str(params.ti.info_hashes().get_best())
+
+        # The session has a single handle per torrent, a second download of it would share it
+        with self._lock:
+            download = self._by_hash.get(info_hash)
+        if download is not None:
+            logger.info(f"{title or source} is already download {download.id}.")
+            return download
+
+        if params.ti is None:
+            params.ti = self._metadata.get(info_hash)
+            if params.ti is not None:
+                logger.debug(f"Starting {info_hash} from its cached metadata.")
+        params.save_path = save_path or self._save_path
+        params.storage_mode = self._profile.storage_mode
+
+        if not queued:
+            params.flags &= ~(lt.torrent_flags.auto_managed | lt.torrent_flags.paused)
+
+        download = self._register(params, title=title, stop_after_download=stop_after_download)
+        logger.info(f"Queued download {download.id}: {title or source}")
+
+        # The magnet link starts right away, the torrent file only helps if it arrives before the swarm sends the metadata
+        if params.ti is None and torrent_links:
+            threading.Thread(
+                target=self._fetch_metadata, args=(download, info_hash, torrent_links), name="metadata", daemon=True
+            ).start()
+
+        if not self._file_filter.is_empty:
+            download.file_filter = self._file_filter
+            self._select_files(download)
+        return download
+
+    def filter_files(self, download_id: int, file_filter: FileFilter) -> bool:
+        """
+        Restricts a download to some of its files, right away if its metadata is known or as soon as it is received.
+        """
+        download = self.get(download_id)
+        if download is None:
+            return False
+        download.file_filter = file_filter
+        self._select_files(download)
+        return True
+
+    def stream(self, download_id: int) -> bool:
+        """
+        Switches a download to streaming, right away if its metadata is known or as soon as it is received.
+        """
+        download = self.get(download_id)
+        if download is None:
+            return False
+        if download.stream is None:
+            download.stream = Stream(download.handle)
+            self._select_files(download)
+        return True
+
+    def pause(self, download_id: int) -> bool:
+        download = self.get(download_id)
+        if download is None:
+            return False
+        download.pause()
+        return True
+
+    def resume(self, download_id: int) -> bool:
+        download = self.get(download_id)
+        if download is None:
+            return False
+        download.resume()
+        return True
+
+    def remove(self, download_id: int, delete_files: bool = False) -> bool:
+        """
+        Removes a download from the session, and its files from the disk if asked to.
+        """
+        with self._lock:
+            download = self._downloads.get(download_id)
+            if download is None:
+                return False
+            self._forget(download)
+
+        self._resume_data.remove(download.info_hash)
+        download.stop(delete_files=delete_files)
+        logger.info(f"Removed download {download.id}: {download.name}")
+        return True
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            # Any alert wakes the thread up, so it notices it has to stop without waiting for the next update
+            self._lt_session.post_torrent_updates()
+            self._thread.join()
+            self._thread = None
+
+        if self._lt_session is None:
+            return
+
+        # Nothing is written to disk any more, so the resume data saved now matches the files left behind
+        self._lt_session.pause()
+        self._save_resume_data(lt.save_resume_flags_t.flush_disk_cache | lt.save_resume_flags_t.save_info_dict)
+
+        deadline = time.monotonic() + RESUME_SAVE_TIMEOUT
+        while self._pending_saves > 0 and time.monotonic() < deadline:
+            if self._lt_session.wait_for_alert(int(UPDATE_INTERVAL * 1000)):
+                self._handle_alerts()
+
+        if self._pending_saves > 0:
+            logger.warning(f"Gave up waiting for the resume data of {self._pending_saves} downloads.")
+
+    def _register(self, params, title: str = None, stop_after_download: bool = False) -> DownloaderWrapper:
+        download = DownloaderWrapper(
+            session=self._lt_session, torrent_info=params, save_path=self._save_path, libtorrent=lt,
+            is_magnet=params.ti is None, stop_after_download=stop_after_download, download_id=next(self._ids),
+            title=title
+        )
+        download.set_limits(self._torrent_download_limit, self._torrent_upload_limit)
+
+        with self._lock:
+            self._downloads[download.id] = download
+            self._by_hash[download.info_hash] = download
+        return download
+
+    def _fetch_metadata(self, download: DownloaderWrapper, info_hash: str, links: list[str]):
+        """
+        Downloads the torrent file of a magnet link and hands its metadata to the download, unless the swarm sent it
+        first or the download was removed in the meantime.
+        """
+        torrent_info = self._metadata.fetch(info_hash, links)
+        if torrent_info is None or self._closed.is_set() or self.get(download.id) is not download:
+            return
+
+        try:
+            if not download.handle.status().has_metadata:
+                logger.debug(f"Starting {info_hash} from its downloaded torrent file.")
+                download.handle.set_metadata(torrent_info.info_section())
+        except RuntimeError as e:
+            logger.debug(f"Could not hand the torrent file of {info_hash} to download {download.id}: {e}")
+
+    def _forget(self, download: DownloaderWrapper):
+        """
+        Drops a download from the queue, so the same torrent can be added again. Called with the lock held.
+        """
+        self._downloads.pop(download.id, None)
+        self._by_hash = {info_hash: other for info_hash, other in self._by_hash.items() if other is not download}
+
+    def _select_files(self, download: DownloaderWrapper):
+        """
+        Sets the file priorities of a download from its filter and its streaming mode, once its metadata is known.
+
+        The priorities are built from the filter on every call rather than from the current ones, which may not have
+        reached the disk yet and would keep the files skipped by a previous filter.
+        """
+        torrent_info = download.handle.torrent_file()
+        if torrent_info is None or (download.file_filter is None and download.stream is None):
+            return
+
+        files = list_files(torrent_info)
+        priorities = download.handle.get_file_priorities()
+
+        if download.file_filter is not None:
+            selected = download.file_filter.select(files)
+            indices = {file.index for file in selected}
+            for file in files:
+                priorities[file.index] = DEFAULT_PRIORITY if file.index in indices else DONT_DOWNLOAD
+            download.selected_bytes = sum(file.size for file in selected)
+            logger.info(f"Selected {len(selected)} of the {len(files)} files of download {download.id}.")
+
+        if download.stream is not None:
+            download.stream.prepare(torrent_info, files, priorities)
+
+        download.handle.prioritize_files(priorities)
+        if download.stream is not None:
+            download.stream.update()
+
+    def _monitor(self):
+        """
+        Handles the alerts of the session as soon as they are posted, and asks for the status of the torrents that
+        changed once per update interval. A torrent that did not change costs nothing.
+        """
+        last_update = last_save = time.monotonic()
+        self._lt_session.post_torrent_updates()
+
+        while not self._closed.is_set():
+            self._lt_session.wait_for_alert(int(UPDATE_INTERVAL * 1000))
+            self._handle_alerts()
+
+            now = time.monotonic()
+            if now - last_update >= UPDATE_INTERVAL:
+                self._lt_session.post_torrent_updates()
+                last_update = now
+
+            if now - last_save >= self._resume_interval:
+                self._save_resume_data(lt.save_resume_flags_t.only_if_modified | lt.save_resume_flags_t.save_info_dict)
+                last_save = now
+
+    def _finish(self, download: DownloaderWrapper):
+        if download.announced:
+            return
+
+        # The samples and extras held back while streaming still have to be downloaded
+        if download.stream is not None and not download.stream.extras_downloaded():
+            # The connections to the seeders are closed when a torrent finishes, announcing it gets peers back
+            download.handle.force_reannounce()
+            return
+
+        download.announced = True
+        logger.info(f"Finished download {download.id}: {download.name}")
+
+        # Finished downloads are not restored on the next start
+        self._resume_data.remove(download.info_hash)
+        if download.stop_after_download:
+            download.stop()
+            with self._lock:
+                self._forget(download)
+
+        download.notify('finished')
+
+    def _save_resume_data(self, flags):
+        """
+        Asks the session for the resume data of every unfinished download. The data arrives later as an alert.
+        """
+        for download in self.downloads:
+            try:
+                if download.announced or download.handle is None or not download.handle.need_save_resume_data():
+                    continue
+                download.handle.save_resume_data(flags)
+                self._pending_saves += 1
+            except RuntimeError as e:
+                logger.warning(f"Failed to request the resume data of download {download.id}: {e}")
+
+    @staticmethod
+    def _settings(download: DownloaderWrapper) -> dict:
+        """
+        Settings of a download restored along with its resume data.
+        """
+        return {
+            'title': download.title,
+            'stream': download.stream is not None,
+            'file_filter': asdict(download.file_filter) if download.file_filter is not None else None,
+        }
 
-        self._session.set_download_limit(download_speed)
-        self._session.set_upload_limit(upload_speed)
+    def _find(self, info_hashes) -> Optional[DownloaderWrapper]:
+        with self._lock:
+            return self._by_hash.get(str(info_hashes.get_best()))
 
-        self._file = self._downloader
-        await self._file.download()
\ No newline at end of file
+    def _handle_alerts(self):
+        for alert in self._lt_session.pop_alerts():
+            if isinstance(alert, lt.state_update_alert):
+                for status in alert.status:
+                    download = self._find(status.info_hashes)
+                    if download is None:
+                        continue
+                    if download.stream is not None:
+                        download.stream.update()
+                    download.notify('state', status)
+                    if status.is_seeding:
+                        self._finish(download)
+            elif isinstance(alert, lt.torrent_finished_alert):
+                download = self._find(alert.handle.info_hashes())
+                if download is not None:
+                    if download.stream is not None:
+                        download.stream.update()
+                    download.notify('state', alert.handle.status())
+                    self._finish(download)
+            elif isinstance(alert, lt.metadata_received_alert):
+                self._metadata.put(alert.handle.torrent_file())
+                download = self._find(alert.handle.info_hashes())
+                if download is not None:
+                    self._select_files(download)
+                    download.notify('metadata', alert.handle.status())
+            elif isinstance(alert, lt.save_resume_data_alert):
+                self._pending_saves -= 1
+                # The download may have been removed, or have finished, since its resume data was asked for
+                download = self._find(alert.params.info_hashes)
+                if download is not None and not download.announced:
+                    self._resume_data.save(alert.params, self._settings(download))
+            elif isinstance(alert, lt.save_resume_data_failed_alert):
+                self._pending_saves -= 1
+                logger.warning(f"Failed to save resume data: {alert.message()}")
+            elif isinstance(alert, lt.piece_finished_alert):
+                download = self._find(alert.handle.info_hashes())
+                if download is not None and download.stream is not None:
+                    download.stream.update()
+            elif isinstance(alert, lt.storage_moved_alert):
+                # The directory a download was moved out of, such as the one it was probed in, is left empty
+                try:
+                    os.rmdir(alert.old_path())
+                except OSError:
+                    pass
+            elif isinstance(alert, lt.torrent_error_alert):
+                logger.error(f"Download error: {alert.message()}")
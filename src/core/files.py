@@ -0,0 +1,96 @@
+import fnmatch
+import re
+from dataclasses import dataclass, field
+from pathlib import PurePath
+from typing import Optional
+
+import libtorrent as lt
+
+from src.constants import DOWNLOAD_INCLUDE, DOWNLOAD_EXCLUDE, DOWNLOAD_MIN_FILE_SIZE, DOWNLOAD_LARGEST_VIDEO_ONLY
+
+VIDEO_EXTENSIONS = {'.mkv', '.mp4', '.m4v', '.avi', '.mov', '.wmv', '.webm', '.mpg', '.mpeg', '.ts', '.m2ts', '.flv'}
+
+# Files, or folders, bundled next to the movie that nobody downloads the torrent for
+EXTRA_PATTERN = re.compile(
+    r'(?:^|[\W_])(?:sample|trailer|teaser|extras?|featurettes?|bonus|behind[\W_]the[\W_]scenes|deleted[\W_]scenes)(?:[\W_]|$)',
+    re.IGNORECASE
+)
+
+
+@dataclass
+class TorrentFile:
+    index: int
+    path: str
+    size: int
+    offset: int
+
+    @property
+    def is_video(self) -> bool:
+        return PurePath(self.path).suffix.lower() in VIDEO_EXTENSIONS
+
+    @property
+    def is_extra(self) -> bool:
+        return EXTRA_PATTERN.search(self.path) is not None
+
+
+def list_files(torrent_info) -> list[TorrentFile]:
+    """
+    Lists the files of a torrent, leaving out the padding files that align the other ones on pieces.
+    """
+    storage = torrent_info.files()
+    return [
+        TorrentFile(index, storage.file_path(index), storage.file_size(index), storage.file_offset(index))
+        for index in range(storage.num_files())
+        if not storage.file_flags(index) & lt.file_storage.flag_pad_file
+    ]
+
+
+def main_video(files: list[TorrentFile]) -> Optional[TorrentFile]:
+    """
+    The movie itself: the largest video that is not a sample or an extra, or the largest video if they all look like
+    extras.
+    """
+    videos = [file for file in files if file.is_video]
+    candidates = [file for file in videos if not file.is_extra] or videos
+    return max(candidates, key=lambda file: file.size, default=None)
+
+
+@dataclass
+class FileFilter:
+    """
+    Files of a torrent worth downloading.
+
+    Patterns are shell-style and case-insensitive, matched against the path of the file in the torrent and against its
+    name, and the minimum size is in MB. The largest video is picked among the files left by the other rules.
+    """
+    include: list[str] = field(default_factory=lambda: list(DOWNLOAD_INCLUDE))
+    exclude: list[str] = field(default_factory=lambda: list(DOWNLOAD_EXCLUDE))
+    min_size: float = DOWNLOAD_MIN_FILE_SIZE
+    largest_video_only: bool = DOWNLOAD_LARGEST_VIDEO_ONLY
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.include or self.exclude or self.min_size > 0 or self.largest_video_only)
+
+    def select(self, files: list[TorrentFile]) -> list[TorrentFile]:
+        """
+        :return: Files to download, or all of them if the filter leaves none.
+        """
+        selected = [
+            file for file in files
+            if (not self.include or self._matches(file, self.include))
+            and not self._matches(file, self.exclude)
+            and file.size >= self.min_size * 1000 ** 2
+        ]
+
+        if self.largest_video_only:
+            video = main_video(selected)
+            selected = [video] if video else []
+
+        return selected or files
+
+    @staticmethod
+    def _matches(file: TorrentFile, patterns: list[str]) -> bool:
+        path = file.path.lower()
+        name = PurePath(path).name
+        return any(fnmatch.fnmatch(path, pattern.lower()) or fnmatch.fnmatch(name, pattern.lower()) for pattern in patterns)
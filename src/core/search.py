@@ -1,11 +1,12 @@
-import json
 import logging
+import threading
 import time
 import urllib.parse
-from typing import Set, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, as_completed, FIRST_COMPLETED
+from contextlib import ExitStack
+from typing import Set, Optional, Iterator, Iterable, Callable, Union
 
-from bs4 import BeautifulSoup
-from pydantic import ValidationError
 from rich.live import Live
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from time import sleep
@@ -13,46 +14,208 @@ from time import sleep
 from rich.spinner import Spinner
 from rich.text import Text
 
-from src.constants import TORRENT_BASE_URL, MOVIE_STORE_FILE
+from src.constants import (
+    TORRENT_BASE_URL, CRAWL_WORKERS, CRAWL_HOST_CONCURRENCY, HYDRATION_WORKERS,
+    MOVIE_STORE_LAZY, MOVIE_CACHE_SIZE, BATCH_SEARCH_WORKERS, BATCH_COMMIT_SIZE
+)
 from src.core.cli import console
+from src.core.store import open_store, StoreEntry
 from src.schemas.movie_schema import Movie
+from src.schemas.torrent_schema import Torrent
+from src.utils.concurrency import HostLimiter
+from src.utils.html import parse_html, link_strainer
 from src.utils.requests import requests
 
 logger = logging.getLogger(__name__)
 
 
+class MovieStream:
+    """
+    Movies of a search, yielded as soon as they are built. Meant to be used as a context manager: entering it opens the
+    search scope and crawls the links of the movies, leaving it stores the movies built so far and closes the scope.
+    """
+
+    def __init__(self, find_links: Callable[[], Set[str]], hydrate: Callable[[Set[str]], Iterator['Movie']], force: bool):
+        self._find_links = find_links
+        self._hydrate = hydrate
+        self._force = force
+        self._movies: Optional[Iterator['Movie']] = None
+        self._scope = ExitStack()
+
+    def __enter__(self) -> 'MovieStream':
+        # The scope is closed right away if the links cannot be crawled
+        with ExitStack() as stack:
+            stack.enter_context(requests.search_scope(refresh=self._force))
+            urls = self._find_links()
+            self._scope = stack.pop_all()
+
+        self._movies = self._hydrate(urls)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._movies is not None:
+            self._movies.close()
+            self._movies = None
+        self._scope.close()
+
+    def __iter__(self) -> 'MovieStream':
+        if self._movies is None:
+            raise RuntimeError("Enter the movie stream with a `with` statement before iterating over it.")
+        return self
+
+    def __next__(self) -> 'Movie':
+        return next(self._movies)
+
+
 class SearchEngine:
-    def __init__(self):
+    def __init__(
+            self,
+            workers: int = CRAWL_WORKERS,
+            host_concurrency: int = CRAWL_HOST_CONCURRENCY,
+            hydration_workers: int = HYDRATION_WORKERS,
+            lazy: bool = MOVIE_STORE_LAZY,
+            interactive: bool = True
+    ):
         self._movie_search_url = TORRENT_BASE_URL + "/sort-category-search/{query}/Movies/seeders/desc/1/"
 
-        self._movie_store = {}
-        self._movie_id_store = {}
+        self._workers = max(1, workers)
+        self._host_limiter = HostLimiter(host_concurrency)
+        self._hydration_workers = max(1, hydration_workers)
+
+        # Messages are only left on screen for a moment when someone is there to read them
+        self._interactive = interactive
+
+        # Every known movie is indexed by URL and ID, but in lazy mode only a bounded number of them are built
+        self._lazy = lazy
+        self._movie_index: dict[str, StoreEntry] = {}
+        self._movie_id_index: dict[int, str] = {}
+        self._movie_cache: OrderedDict[str, Movie] = OrderedDict()
+        self._movie_cache_lock = threading.RLock()
 
-        self._torrent_id_store = {}
+        self._torrent_id_index: dict[int, int] = {}
 
+        self._store = open_store()
         self._load_movies()
 
     @property
     def movies(self) -> list[Movie]:
-        return list(self._movie_store.values())
+        return self.history()
 
-    def get(self, idx: int, from_torrents: bool = False) -> Optional[Movie]:
-        if from_torrents:
-            return self._torrent_id_store.get(idx, None)
-        else:
-            return self._movie_id_store.get(idx, None)
+    def get(self, idx: int, from_torrents: bool = False) -> Optional[Union[Movie, Torrent]]:
+        if not from_torrents:
+            return self._get_movie(self._movie_id_index.get(idx, None))
+
+        movie_id = self._torrent_id_index.get(idx, None)
+        if movie_id is None and self._lazy:
+            movie_id = self._store.find_torrent(idx)
+
+        movie = self._get_movie(self._movie_id_index.get(movie_id, None))
+        return next((torrent for torrent in movie.torrents if torrent.id == idx), None) if movie else None
+
+    def history(self, title: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None) -> list[Movie]:
+        """
+        Returns the stored movies. They are filtered, sorted and limited on the index, so only the movies returned
+        are built.
+
+        :param title: Text the movie title must contain, case-insensitive.
+        :param sort: Attribute to sort by: title, or year and rating from the highest.
+        :param limit: Maximum number of movies to return.
+        :return: List of movies.
+        """
+        entries = list(self._movie_index.values())
+        if title:
+            entries = [entry for entry in entries if title.lower() in entry.title.lower()]
+
+        if sort == 'year':
+            entries.sort(key=lambda entry: entry.year or 0, reverse=True)
+        elif sort == 'rating':
+            entries.sort(key=lambda entry: entry.rating or 0, reverse=True)
+        elif sort == 'title':
+            entries.sort(key=lambda entry: entry.title)
+
+        if limit is not None:
+            entries = entries[:limit]
+
+        return [movie for movie in (self._get_movie(entry.url) for entry in entries) if movie]
 
     # noinspection PyUnresolvedReferences
     def search(self, query: str, force: bool = False, language: str = None, torrents: int = None) -> list['Movie']:
-        movies = set()
+        # Pages fetched while crawling are reused while building the movies
+        with requests.search_scope(refresh=force):
+            urls = self._find_movie_links(query)
+
+            with (Progress(
+                    TextColumn("{task.description}"),
+                    SpinnerColumn(),
+                    BarColumn(complete_style="green"),
+                    TextColumn("{task.completed}/{task.total}", style="progress.completed"),
+                    TimeElapsedColumn(),
+                    console=console,
+                    transient=True
+            ) as progress):
+                task = progress.add_task("Processing", total=len(urls))
+                movies = list(self._hydrate_movies(
+                    urls, force=force, language=language, torrents=torrents,
+                    callback=lambda: progress.update(task, advance=1)
+                ))
+
+        return movies
+
+    def stream(self, query: str, force: bool = False, language: str = None, torrents: int = None) -> MovieStream:
+        """
+        Searches for movies and yields each one as soon as it has been built, e.g.
+        `with engine.stream("the matrix") as movies: ...`.
 
-        with Live(console=console, transient=True) as live:
-            live.update(Spinner(name='dots', text="Fetching movie links...", style='green'))
-            urls = self._get_movie_links(query)
-            live.update(Text("Movie links fetched successfully!", style='green'))
-            sleep(2)
+        Link discovery runs when the stream is entered, so the caller is free to open its own live display while
+        iterating over the results.
 
-        with (Progress(
+        :param query: Search query.
+        :param force: Overwrite stored movies if possible, revalidating the cached pages.
+        :param language: Language to search in the torrent files.
+        :param torrents: Minimum number of torrents to explore.
+        :return: Context manager iterating over the movies found.
+        """
+        return MovieStream(
+            lambda: self._find_movie_links(query),
+            lambda urls: self._hydrate_movies(urls, force=force, language=language, torrents=torrents),
+            force
+        )
+
+    def batch_search(
+            self,
+            queries: Iterable[str],
+            force: bool = False,
+            language: str = None,
+            torrents: int = None,
+            workers: int = BATCH_SEARCH_WORKERS,
+            commit_size: int = BATCH_COMMIT_SIZE
+    ) -> dict:
+        """
+        Searches for many titles in one run.
+
+        The links of several titles are crawled at once, then every movie found is built once on a shared pool, even
+        when several titles lead to it. Pages are shared between titles for the whole run, and movies are stored in
+        batches as they are built.
+
+        :param queries: Search queries, duplicates are searched once regardless of case.
+        :param force: Overwrite stored movies if possible, revalidating the cached pages.
+        :param language: Language to search in the torrent files.
+        :param torrents: Minimum number of torrents to explore.
+        :param workers: Number of titles crawled at once.
+        :param commit_size: Number of movies stored per commit.
+        :return: Summary of the run, with the movies found for each query.
+        """
+        # Searches are case-insensitive, keep the first spelling of each query
+        unique_queries = {}
+        for query in queries:
+            unique_queries.setdefault(query.strip().lower(), query.strip())
+        queries = [query for query in unique_queries.values() if query]
+        start_time = time.perf_counter()
+
+        results = {query: {"query": query, "movies": [], "error": None} for query in queries}
+        queries_by_url: dict[str, list[str]] = {}
+
+        with requests.search_scope(refresh=force), Progress(
                 TextColumn("{task.description}"),
                 SpinnerColumn(),
                 BarColumn(complete_style="green"),
@@ -60,120 +223,237 @@ class SearchEngine:
                 TimeElapsedColumn(),
                 console=console,
                 transient=True
-        ) as progress):
-            task = progress.add_task("Processing", total=len(urls))
-            for url in urls:
-                try:
-                    stored_movie: Movie = self._movie_store.get(url, None)
+        ) as progress:
+            task = progress.add_task("Crawling", total=len(queries))
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as executor:
+                futures = {executor.submit(self._get_movie_links, query): query for query in queries}
+                for future in as_completed(futures):
+                    query = futures[future]
+                    try:
+                        for url in future.result():
+                            queries_by_url.setdefault(url, []).append(query)
+                    except Exception as e:
+                        logger.error(f"Error crawling the results of '{query}': {e}")
+                        results[query]["error"] = str(e)
+                    progress.update(task, advance=1)
+
+            progress.update(task, description="Processing", completed=0, total=len(queries_by_url))
+            movies = list(self._hydrate_movies(
+                set(queries_by_url), force=force, language=language, torrents=torrents,
+                callback=lambda: progress.update(task, advance=1), commit_size=commit_size
+            ))
 
-                    if stored_movie and not force:
-                        movie = stored_movie
-                    else:
-                        movie = Movie.from_url(url, language=language, torrents=torrents)
-                        movie.id = stored_movie.id if stored_movie else movie.id
+        for movie in movies:
+            for query in queries_by_url.get(str(movie.url), []):
+                results[query]["movies"].append({"id": movie.id, "title": movie.title, "year": movie.year, "url": str(movie.url)})
+
+        return {
+            "queries": len(queries),
+            "queries_without_results": sum(1 for result in results.values() if not result["movies"]),
+            "movies": len(movies),
+            "seconds": round(time.perf_counter() - start_time, 2),
+            "results": list(results.values()),
+        }
 
-                    if movie:
-                        movies.add(movie)
-                    else:
+    def close(self):
+        """
+        Closes the movie store, once the search engine is no longer used.
+        """
+        self._store.close()
+
+    def _find_movie_links(self, query: str) -> Set[str]:
+        with Live(console=console, transient=True) as live:
+            live.update(Spinner(name='dots', text="Fetching movie links...", style='green'))
+            urls = self._get_movie_links(query)
+            live.update(Text("Movie links fetched successfully!", style='green'))
+            if self._interactive:
+                sleep(2)
+
+        return urls
+
+    def _hydrate_movies(
+            self,
+            urls: Set[str],
+            force: bool = False,
+            language: str = None,
+            torrents: int = None,
+            callback: Callable[[], None] = None,
+            commit_size: int = None
+    ) -> Iterator['Movie']:
+        """
+        Builds the movies for the given URLs on a thread pool, yielding them in completion order.
+
+        The movies are stored every `commit_size` movies if given, and the remaining ones once the generator is
+        exhausted or closed.
+        """
+        movies = set()
+        pending = []
+
+        executor = ThreadPoolExecutor(max_workers=self._hydration_workers, thread_name_prefix="hydrate")
+        try:
+            futures = {
+                executor.submit(self._hydrate_movie, url, force, language, torrents): url
+                for url in urls
+            }
+
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    movie = future.result()
+
+                    if not movie:
                         logger.warning(f"Movie skipped for `{url}`")
+                    elif movie not in movies:
+                        movies.add(movie)
+                        pending.append(movie)
+                        if commit_size and len(pending) >= commit_size:
+                            self._store_movies(pending)
+                            pending = []
+                        yield movie
                 except Exception as e:
                     logger.error(f"Error fetching movie from URL {url}: {e}")
-                progress.update(task, advance=1)
 
-        self._store_movies(list(movies))
+                if callback:
+                    callback()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._store_movies(pending)
 
-        return list(movies)
+    def _hydrate_movie(self, url: str, force: bool, language: Optional[str], torrents: Optional[int]) -> Optional[Movie]:
+        stored_movie: Movie = self._get_movie(url)
+
+        if stored_movie and not force:
+            return stored_movie
+
+        # The movie built from the page is shared with other callers, the stored ID goes on a copy of it
+        movie = Movie.from_url(url, language=language, torrents=torrents)
+        if stored_movie and movie.id != stored_movie.id:
+            movie = movie.model_copy(update={'id': stored_movie.id})
+
+        return movie
 
     def _load_movies(self):
-        if not MOVIE_STORE_FILE.exists():
-            logger.warning(f"Movie store file {MOVIE_STORE_FILE} does not exist. Creating a new one.")
-            with MOVIE_STORE_FILE.open("w", encoding="utf-8") as f:
-                json.dump([], f)
-
-        with MOVIE_STORE_FILE.open("r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-                movies = [Movie.model_validate(movie_data) for movie_data in data]
-                self._store_movies(movies, save=False)
-            except (json.JSONDecodeError, ValidationError) as e:
-                logger.error(f"Failed to load movie store: {e}")
-
-        for movie in self._movie_store.values():
-            for torrent in movie.torrents:
-                if torrent.id in self._torrent_id_store:
-                    logger.warning(f"Duplicate torrent ID for movies {movie.title} and {self._torrent_id_store[torrent.id]}.")
-                else:
-                    self._torrent_id_store[torrent.id] = torrent
-
-    def _save_movies(self):
-        if not MOVIE_STORE_FILE.exists():
-            logger.error(f"Movie store file {MOVIE_STORE_FILE} cannot be found.")
-            with MOVIE_STORE_FILE.open("w", encoding="utf-8") as f:
-                json.dump([], f)
-
-        with MOVIE_STORE_FILE.open("w", encoding="utf-8") as f:
-            json.dump([m.model_dump(mode="json") for m in self._movie_store.values()], f, indent=2)
+        if self._lazy:
+            for entry in self._store.index():
+                self._movie_index[entry.url] = entry
+                self._movie_id_index[entry.id] = entry.url
+        else:
+            self._store_movies(self._store.load(), save=False)
+
+    def _get_movie(self, url: Optional[str]) -> Optional[Movie]:
+        if url is None:
+            return None
+
+        with self._movie_cache_lock:
+            if url in self._movie_cache:
+                self._movie_cache.move_to_end(url)
+                return self._movie_cache[url]
+
+        entry = self._movie_index.get(url, None)
+        movie = self._store.get(entry.id) if entry else None
+        if movie:
+            self._cache_movie(movie)
+
+        return movie
+
+    def _cache_movie(self, movie: Movie):
+        url = str(movie.url)
+
+        with self._movie_cache_lock:
+            self._movie_cache[url] = movie
+            self._movie_cache.move_to_end(url)
+
+            while self._lazy and len(self._movie_cache) > MOVIE_CACHE_SIZE:
+                self._movie_cache.popitem(last=False)
+
+        for torrent in movie.torrents:
+            movie_id = self._torrent_id_index.setdefault(torrent.id, movie.id)
+            if movie_id != movie.id:
+                logger.warning(f"Duplicate torrent ID for movies {movie.title} and {self._movie_id_index.get(movie_id)}.")
 
     def _store_movies(self, movies: list[Movie], save: bool = True):
         for movie in movies:
-            self._movie_store[str(movie.url)] = movie
-            self._movie_id_store[movie.id] = movie
+            url = str(movie.url)
+            self._movie_index[url] = StoreEntry(id=movie.id, url=url, title=movie.title, year=movie.year, rating=movie.rating)
+            self._movie_id_index[movie.id] = url
+            self._cache_movie(movie)
 
         if save:
-            self._save_movies()
+            self._store.save(movies)
 
     def _get_movie_links(self, query: str) -> Set[str]:
         """
         Fetches direct movie page URLs from the search results.
 
+        Torrent and movie pages are crawled concurrently, and torrent links already listed on a discovered movie page
+        are pruned before they are fetched.
+
         :param query: Search query.
         :return: Set of movie page URLs.
         """
         formatted_query = urllib.parse.quote_plus(query)
         search_url = self._movie_search_url.format(query=formatted_query)
 
-        response = requests.fetch_url(search_url)
-        if not response:
-            return set()
-
-        soup = BeautifulSoup(response, 'html.parser')
-
         # Extract links to torrents
-        torrent_links = {
-            TORRENT_BASE_URL + link["href"]
-            for link in soup.select('a[href^="/torrent/"]')
-        }
+        torrent_links = set(self._fetch_links(search_url, "/torrent/") or [])
 
-        # Fetch movie links from each torrent page
         movie_links = set()
+        visited_movies = set()
+
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="crawl") as executor:
+            in_flight: dict[Future, tuple[str, str]] = {}
+
+            def submit(kind: str, page_url: str):
+                prefix = "/movie/" if kind == "torrent" else "/torrent/"
+                in_flight[executor.submit(self._fetch_links, page_url, prefix)] = (kind, page_url)
+
+            def fill():
+                while torrent_links and len(in_flight) < self._workers:
+                    submit("torrent", torrent_links.pop())
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, url = in_flight.pop(future)
+                    try:
+                        links = future.result()
+                    except Exception as e:
+                        logger.error(f"Error crawling {url}: {e}")
+                        continue
+
+                    if links is None:
+                        continue
+
+                    if kind == "torrent":
+                        # A torrent page links to its movie page, fetch each movie page only once
+                        if links and links[0] not in visited_movies:
+                            visited_movies.add(links[0])
+                            submit("movie", links[0])
+                    else:
+                        movie_links.add(url)
+                        torrent_links.difference_update(links)
 
-        # Use copy to safely modify the set during iteration
-        while torrent_links:
-            url = torrent_links.pop()
-            start_time = time.perf_counter()
-            response = requests.fetch_url(url)
-
-            if not response:
-                continue
+                fill()
 
-            soup = BeautifulSoup(response, 'html.parser')
-            movie_link = soup.select_one('a[href^="/movie/"]')
-            logger.debug(f"Fetched {url} in {(time.perf_counter() - start_time):.2f} seconds")
+        return movie_links
 
-            if movie_link:
-                movie_url = TORRENT_BASE_URL + movie_link["href"]
-                movie_response = requests.fetch_url(movie_url)
+    def _fetch_links(self, url: str, prefix: str) -> Optional[list[str]]:
+        """
+        Fetches a page and extracts the absolute URLs of the links whose path starts with the given prefix.
 
-                if not movie_response:
-                    continue
+        :param url: Page URL.
+        :param prefix: Link path prefix, e.g. `/torrent/`.
+        :return: List of URLs in page order, or None if the page could not be fetched.
+        """
+        start_time = time.perf_counter()
+        with self._host_limiter.limit(url):
+            response = requests.fetch_url(url)
 
-                movie_soup = BeautifulSoup(movie_response, 'html.parser')
-                movie_torrent_links = {
-                    TORRENT_BASE_URL + link["href"]
-                    for link in movie_soup.select('a[href^="/torrent/"]')
-                }
+        if not response:
+            return None
 
-                movie_links.add(movie_url)
-                torrent_links -= movie_torrent_links
+        soup = parse_html(response, parse_only=link_strainer(prefix))
+        logger.debug(f"Fetched {url} in {(time.perf_counter() - start_time):.2f} seconds")
 
-        return movie_links
\ No newline at end of file
+        return [TORRENT_BASE_URL + link["href"] for link in soup.select(f'a[href^="{prefix}"]')]
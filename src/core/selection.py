@@ -0,0 +1,137 @@
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from src.constants import SELECTION_PROBE_SECONDS, SELECTION_CANDIDATES
+from src.core.download import DownloadManager, DownloaderWrapper
+from src.schemas.torrent_schema import Torrent
+
+logger = logging.getLogger(__name__)
+
+# Download rate, in bytes per second, credited to each seeder of a swarm that has not sent anything yet
+SEEDER_RATE_ESTIMATE = 50 * 1024
+
+
+@dataclass
+class Probe:
+    torrent: Torrent
+    download: DownloaderWrapper
+
+    @property
+    def remaining_bytes(self) -> int:
+        status = self.download.status()
+        if status.has_metadata:
+            return status.total_wanted - status.total_wanted_done
+        return self.torrent.size.to_bytes() if self.torrent.size else 0
+
+    def estimated_seconds(self, elapsed: float) -> float:
+        """
+        Time the torrent would take to finish, at the rate measured during the probe, or at a rate estimated from
+        its seeders if nothing has been received yet.
+        """
+        status = self.download.status()
+
+        # Some pieces are missing from the swarm, the download could never finish
+        if status.has_metadata and status.num_seeds == 0 and 0 <= status.distributed_copies < 1:
+            return math.inf
+
+        rate = status.total_payload_download / elapsed if elapsed > 0 else 0
+        if rate <= 0:
+            rate = max(status.num_seeds, status.list_seeds) * SEEDER_RATE_ESTIMATE
+        if rate <= 0:
+            return math.inf
+
+        return self.remaining_bytes / rate
+
+    def describe(self, elapsed: float) -> str:
+        status = self.download.status()
+        seconds = self.estimated_seconds(elapsed)
+        estimate = "never" if math.isinf(seconds) else f"{seconds:.0f}s"
+        return (
+            f"'{self.torrent.title}': {status.num_peers} peers, {status.num_seeds} seeds, "
+            f"{status.distributed_copies:.2f} copies, {status.total_payload_download} bytes received, finishes in {estimate}"
+        )
+
+
+class TorrentSelector:
+    """
+    Picks the torrent of a movie that should finish first.
+
+    The scraped seeder counts can be stale, so the best candidates are all started at once on the session of the
+    download manager for a few seconds. Each one is then scored on the time its remaining size would take at the rate
+    it reached, taking the number of seeders and the availability of its pieces into account. The winner keeps what it
+    downloaded and joins the download queue, the other candidates are removed along with their files.
+
+    Candidates are probed in their own directory, so removing the files of one cannot touch the files of another.
+    A candidate that was already in the queue is probed where it is and left there whatever the outcome.
+    """
+
+    def __init__(
+            self,
+            manager: DownloadManager,
+            probe_seconds: float = SELECTION_PROBE_SECONDS,
+            candidates: int = SELECTION_CANDIDATES
+    ):
+        self._manager = manager
+        self._probe_seconds = probe_seconds
+        self._candidates = max(1, candidates)
+
+    def select(self, torrents: list[Torrent], title: str = None, language: Optional[str] = None) -> DownloaderWrapper:
+        """
+        Probes the torrents and queues the one expected to finish first.
+
+        :param torrents: Torrents of a movie, in the order of the scraped seeder counts.
+        :param title: Name displayed until the torrent metadata is known.
+        :param language: Preferred language, torrents in other languages are only considered if none matches.
+        :return: Download of the selected torrent.
+        """
+        if language:
+            torrents = [torrent for torrent in torrents if torrent.language.lower() == language.lower()] or torrents
+
+        # The same magnet link can be listed twice, the first listing keeps its place in the seeder order
+        unique = {}
+        for torrent in torrents:
+            unique.setdefault(torrent.magnet_link, torrent)
+        torrents = list(unique.values())[:self._candidates]
+
+        if len(torrents) == 1 or self._probe_seconds <= 0:
+            torrent = torrents[0]
+            return self._manager.add(torrent.magnet_link, title=title, torrent_links=torrent.torrent_links)
+
+        finished = threading.Event()
+
+        def listener(event: str):
+            if event == 'finished':
+                finished.set()
+
+        queued = {download.id for download in self._manager.downloads}
+        probes = []
+        for index, torrent in enumerate(torrents):
+            download = self._manager.add(
+                torrent.magnet_link, title=title, torrent_links=torrent.torrent_links, queued=False,
+                save_path=os.path.join(self._manager.save_path, '.probes', str(index))
+            )
+            download.add_listener(listener)
+            probes.append(Probe(torrent, download))
+
+        start_time = time.monotonic()
+        finished.wait(self._probe_seconds)
+        elapsed = time.monotonic() - start_time
+
+        # Ties, such as swarms that sent nothing, go to the torrent with the most scraped seeders
+        winner = min(probes, key=lambda probe: probe.estimated_seconds(elapsed))
+        for probe in probes:
+            logger.debug(f"Probed {probe.describe(elapsed)}")
+            probe.download.remove_listener(listener)
+            if probe is not winner and probe.download.id not in queued:
+                self._manager.remove(probe.download.id, delete_files=True)
+
+        logger.info(f"Selected '{winner.torrent.title}' out of {len(probes)} torrents after {elapsed:.1f} seconds.")
+        if winner.download.id not in queued:
+            winner.download.handle.move_storage(self._manager.save_path)
+            winner.download.resume()
+        return winner.download
@@ -0,0 +1,427 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from pydantic import ValidationError
+
+from src.constants import (
+    MOVIE_STORE_FILE, MOVIE_JOURNAL_FILE, MOVIE_DATABASE_FILE, MOVIE_STORE_BACKEND, MOVIE_JOURNAL_COMPACT_THRESHOLD
+)
+from src.schemas.movie_schema import Movie
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoreEntry:
+    id: int
+    url: str
+    title: str
+    year: Optional[int] = None
+    rating: Optional[float] = None
+
+
+class MovieStore(ABC):
+    """
+    Persistence backend for the movies found by the search engine.
+    """
+
+    @abstractmethod
+    def load(self) -> list[Movie]:
+        ...
+
+    @abstractmethod
+    def index(self) -> list[StoreEntry]:
+        """
+        Lists the stored movies without building them.
+        """
+
+    @abstractmethod
+    def get(self, movie_id: int) -> Optional[Movie]:
+        ...
+
+    @abstractmethod
+    def find_torrent(self, torrent_id: int) -> Optional[int]:
+        """
+        Returns the ID of the stored movie that holds the given torrent.
+        """
+
+    @abstractmethod
+    def save(self, movies: list[Movie]):
+        """
+        Inserts the given movies or updates their stored version.
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Writes what is still pending and releases the backend, once the store is no longer used.
+        """
+
+
+class JsonMovieStore(MovieStore):
+    """
+    Movie store kept as a JSON snapshot plus an append-only journal in JSON Lines format.
+
+    Saved movies are appended to the journal, and replayed over the snapshot when the store is read. Once the journal
+    grows past the compaction threshold, the snapshot is rewritten atomically and the journal is cleared.
+    """
+
+    def __init__(
+            self,
+            path: Path = MOVIE_STORE_FILE,
+            journal_path: Path = MOVIE_JOURNAL_FILE,
+            compact_threshold: int = MOVIE_JOURNAL_COMPACT_THRESHOLD
+    ):
+        self._path = path
+        self._journal_path = journal_path
+        self._compact_threshold = compact_threshold
+
+        self._records: dict[str, dict] = {}
+        self._journal_entries = 0
+        self._journal_corrupted = False
+        self._loaded = False
+        self._lock = threading.Lock()
+
+        atexit.register(self.close)
+
+    def load(self) -> list[Movie]:
+        try:
+            movies = [Movie.model_validate(movie_data) for movie_data in self._read()]
+        except ValidationError as e:
+            logger.error(f"Failed to load movie store: {e}")
+            return []
+
+        self._records = {str(movie.url): movie.model_dump(mode="json") for movie in movies}
+        self.compact(force=self._journal_corrupted)
+        return movies
+
+    def index(self) -> list[StoreEntry]:
+        if not self._loaded:
+            self._records = {record["url"]: record for record in self._read()}
+            self.compact(force=self._journal_corrupted)
+        return [
+            StoreEntry(id=record["id"], url=url, title=record["title"], year=record.get("year"), rating=record.get("rating"))
+            for url, record in self._records.items()
+        ]
+
+    def get(self, movie_id: int) -> Optional[Movie]:
+        record = next((record for record in self._records.values() if record["id"] == movie_id), None)
+        return Movie.model_validate(record) if record else None
+
+    def find_torrent(self, torrent_id: int) -> Optional[int]:
+        for record in self._records.values():
+            if any(torrent["id"] == torrent_id for torrent in record["torrents"]):
+                return record["id"]
+        return None
+
+    def save(self, movies: list[Movie]):
+        if not self._loaded:
+            self.index()
+
+        lines = []
+        for movie in movies:
+            record = movie.model_dump(mode="json")
+            url = str(movie.url)
+            # Stored movies found again by a search are saved unchanged, they would only grow the journal
+            if self._records.get(url) == record:
+                continue
+            self._records[url] = record
+            lines.append(json.dumps(record) + "\n")
+
+        if not lines:
+            return
+
+        with self._lock, self._journal_path.open("a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_entries += len(lines)
+
+    def compact(self, force: bool = False):
+        """
+        Rewrites the snapshot with every record and clears the journal, if it has grown past the threshold or the
+        compaction is forced.
+        """
+        with self._lock:
+            if not force and (not self._journal_entries or self._journal_entries < self._compact_threshold):
+                return
+
+            start_time = time.perf_counter()
+            temp_path = self._path.with_suffix(".tmp")
+            with temp_path.open("w", encoding="utf-8") as f:
+                json.dump(list(self._records.values()), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self._path)
+
+            # Replaying the journal over the new snapshot is harmless, so a crash before this point loses nothing
+            with self._journal_path.open("w", encoding="utf-8"):
+                pass
+
+            logger.debug(f"Compacted {self._journal_entries} journal entries in {(time.perf_counter() - start_time):.2f} seconds")
+            self._journal_entries = 0
+            self._journal_corrupted = False
+
+    def close(self):
+        if self._loaded:
+            self.compact()
+
+    def _read(self) -> list[dict]:
+        if not self._path.exists():
+            logger.warning(f"Movie store file {self._path} does not exist. Creating a new one.")
+            with self._path.open("w", encoding="utf-8") as f:
+                json.dump([], f)
+
+        self._loaded = True
+        records, self._journal_entries, self._journal_corrupted = read_json_records(self._path, self._journal_path)
+        return records
+
+
+def read_json_records(path: Path, journal_path: Path) -> tuple[list[dict], int, bool]:
+    """
+    Reads the records of a JSON store, replaying its journal over its snapshot.
+
+    :return: Records, number of journal entries replayed, and whether the journal had corrupted entries.
+    """
+    records = {}
+    if path.exists():
+        with path.open("r", encoding="utf-8") as f:
+            try:
+                records = {record["url"]: record for record in json.load(f)}
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to load movie store: {e}")
+
+    entries = 0
+    corrupted = False
+    if journal_path.exists():
+        with journal_path.open("r", encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Most likely a write interrupted by a crash, only that entry is lost
+                    logger.warning(f"Skipping corrupted entry {number} of the movie store journal.")
+                    corrupted = True
+                    continue
+                records[record["url"]] = record
+                entries += 1
+
+    return list(records.values()), entries, corrupted
+
+
+class SqliteMovieStore(MovieStore):
+    """
+    Movie store kept in a single SQLite database file, with movies and their torrents in separate tables.
+
+    Every row keeps a checksum of its content, so saving a movie that has not changed does not write anything.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            year INTEGER,
+            rating REAL,
+            checksum TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS torrents (
+            id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL REFERENCES movies (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            title TEXT NOT NULL,
+            language TEXT,
+            seeders INTEGER,
+            checksum TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (movie_id, id)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_movies_title ON movies (title COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_movies_year ON movies (year);
+        CREATE INDEX IF NOT EXISTS idx_movies_rating ON movies (rating);
+        CREATE INDEX IF NOT EXISTS idx_torrents_id ON torrents (id);
+        CREATE INDEX IF NOT EXISTS idx_torrents_url ON torrents (url);
+    """
+
+    def __init__(
+            self,
+            path: Path = MOVIE_DATABASE_FILE,
+            json_path: Path = MOVIE_STORE_FILE,
+            json_journal_path: Path = MOVIE_JOURNAL_FILE
+    ):
+        self._path = path
+        self._lock = threading.Lock()
+
+        self._connection = sqlite3.connect(self._path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.executescript(self.SCHEMA)
+
+        self._import_json(json_path, json_journal_path)
+
+    def load(self) -> list[Movie]:
+        with self._lock:
+            movie_rows = self._connection.execute("SELECT id, data FROM movies").fetchall()
+            torrent_rows = self._connection.execute("SELECT movie_id, data FROM torrents ORDER BY movie_id, position").fetchall()
+
+        torrents: dict[int, list[dict]] = {}
+        for movie_id, data in torrent_rows:
+            torrents.setdefault(movie_id, []).append(json.loads(data))
+
+        movies = []
+        for movie_id, data in movie_rows:
+            try:
+                movie_data = json.loads(data)
+                movie_data["torrents"] = torrents.get(movie_id, [])
+                movies.append(Movie.model_validate(movie_data))
+            except (json.JSONDecodeError, ValidationError) as e:
+                logger.error(f"Failed to load movie {movie_id} from the store: {e}")
+
+        return movies
+
+    def index(self) -> list[StoreEntry]:
+        with self._lock:
+            rows = self._connection.execute("SELECT id, url, title, year, rating FROM movies").fetchall()
+        return [StoreEntry(*row) for row in rows]
+
+    def get(self, movie_id: int) -> Optional[Movie]:
+        with self._lock:
+            movie_row = self._connection.execute("SELECT data FROM movies WHERE id = ?", (movie_id,)).fetchone()
+            torrent_rows = self._connection.execute(
+                "SELECT data FROM torrents WHERE movie_id = ? ORDER BY position", (movie_id,)
+            ).fetchall()
+
+        if not movie_row:
+            return None
+
+        movie_data = json.loads(movie_row[0])
+        movie_data["torrents"] = [json.loads(data) for data, in torrent_rows]
+        return Movie.model_validate(movie_data)
+
+    def find_torrent(self, torrent_id: int) -> Optional[int]:
+        with self._lock:
+            row = self._connection.execute("SELECT movie_id FROM torrents WHERE id = ? LIMIT 1", (torrent_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, movies: list[Movie]):
+        start_time = time.perf_counter()
+        updated = 0
+
+        with self._lock, self._connection:
+            for movie in movies:
+                if self._upsert_movie(movie):
+                    updated += 1
+
+        logger.debug(f"Saved {updated} of {len(movies)} movies in {(time.perf_counter() - start_time):.2f} seconds")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _upsert_movie(self, movie: Movie) -> bool:
+        data = movie.model_dump(mode="json")
+        torrents = data.pop("torrents")
+
+        # The ID of a movie derives from its title, a movie renamed on the website replaces the row stored at its URL
+        self._connection.execute("DELETE FROM movies WHERE url = ? AND id != ?", (str(movie.url), movie.id))
+
+        # The movie checksum covers its torrents, so an unchanged movie skips the torrent table entirely
+        cursor = self._connection.execute(
+            """
+            INSERT INTO movies (id, url, title, year, rating, checksum, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                url = excluded.url,
+                title = excluded.title,
+                year = excluded.year,
+                rating = excluded.rating,
+                checksum = excluded.checksum,
+                data = excluded.data
+            WHERE movies.checksum != excluded.checksum
+            """,
+            (movie.id, str(movie.url), movie.title, movie.year, movie.rating, self._checksum([data, torrents]), json.dumps(data))
+        )
+        if not cursor.rowcount:
+            return False
+
+        for position, torrent in enumerate(torrents):
+            self._connection.execute(
+                """
+                INSERT INTO torrents (id, movie_id, position, url, title, language, seeders, checksum, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (movie_id, id) DO UPDATE SET
+                    position = excluded.position,
+                    url = excluded.url,
+                    title = excluded.title,
+                    language = excluded.language,
+                    seeders = excluded.seeders,
+                    checksum = excluded.checksum,
+                    data = excluded.data
+                WHERE torrents.checksum != excluded.checksum OR torrents.position != excluded.position
+                """,
+                (
+                    torrent["id"], movie.id, position, torrent["url"], torrent["title"], torrent["language"],
+                    torrent["seeders"], self._checksum(torrent), json.dumps(torrent)
+                )
+            )
+
+        torrent_ids = [torrent["id"] for torrent in torrents]
+        self._connection.execute(
+            f"DELETE FROM torrents WHERE movie_id = ? AND id NOT IN ({', '.join('?' * len(torrent_ids))})",
+            (movie.id, *torrent_ids)
+        )
+
+        return True
+
+    def _import_json(self, json_path: Path, journal_path: Path):
+        """
+        Imports the movies of the former JSON store the first time the database is opened. The JSON files are only
+        read, they are left as they are.
+        """
+        with self._lock:
+            imported = self._connection.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if imported or not (json_path.exists() or journal_path.exists()):
+            return
+
+        records, _, _ = read_json_records(json_path, journal_path)
+        try:
+            movies = [Movie.model_validate(record) for record in records]
+        except ValidationError as e:
+            logger.error(f"Failed to import the movies of {json_path}: {e}")
+            return
+        self.save(movies)
+
+        with self._lock, self._connection:
+            self._connection.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (str(time.time()),))
+
+        logger.info(f"Imported {len(movies)} movies from {json_path} into {self._path}.")
+
+    @staticmethod
+    def _checksum(data) -> str:
+        return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def open_store(backend: str = MOVIE_STORE_BACKEND) -> MovieStore:
+    if backend == "json":
+        return JsonMovieStore()
+    if backend == "sqlite":
+        return SqliteMovieStore()
+
+    raise ValueError(f"Unknown movie store backend: '{backend}'")
@@ -0,0 +1,113 @@
+import logging
+from dataclasses import dataclass, field
+
+import libtorrent as lt
+
+from src.constants import DOWNLOAD_PROFILE
+
+logger = logging.getLogger(__name__)
+
+KIB = 1024
+MIB = 1024 * KIB
+
+
+@dataclass
+class SessionProfile:
+    """
+    Settings of the torrent session suited to a kind of machine or disk, and the allocation mode of the files.
+
+    Settings a version of libtorrent does not know, such as the disk cache of the 1.x series which 2.x replaced with
+    memory-mapped files, are skipped when the profile is applied.
+    """
+    name: str
+    description: str
+    settings: dict = field(default_factory=dict)
+    storage_mode: int = lt.storage_mode_t.storage_mode_sparse
+
+    def apply(self, session) -> dict:
+        """
+        :return: Settings that were applied.
+        """
+        known = session.get_settings()
+        settings = {key: value for key, value in self.settings.items() if key in known}
+
+        skipped = sorted(set(self.settings) - set(settings))
+        if skipped:
+            logger.debug(f"Settings unknown to libtorrent {lt.__version__} skipped from the {self.name} profile: {', '.join(skipped)}")
+
+        session.apply_settings(settings)
+        return settings
+
+
+PROFILES = {profile.name: profile for profile in (
+    SessionProfile('default', "Defaults of libtorrent."),
+    SessionProfile(
+        'high-throughput',
+        "Many connections, deep request queues and large disk buffers, for fast links and machines with memory to spare.",
+        {
+            'connections_limit': 800,
+            'max_out_request_queue': 1500,
+            'max_allowed_in_request_queue': 4000,
+            'send_buffer_watermark': 4 * MIB,
+            'send_buffer_watermark_factor': 150,
+            'aio_threads': 16,
+            'hashing_threads': 4,
+            'file_pool_size': 200,
+            'max_queued_disk_bytes': 256 * MIB,
+            'cache_size': 32768,
+            'checking_mem_usage': 1024,
+        },
+    ),
+    SessionProfile(
+        'low-memory',
+        "Few connections, shallow queues and small disk buffers, for small devices.",
+        {
+            'connections_limit': 50,
+            'max_out_request_queue': 100,
+            'max_allowed_in_request_queue': 250,
+            'send_buffer_watermark': 128 * KIB,
+            'aio_threads': 2,
+            'hashing_threads': 1,
+            'file_pool_size': 10,
+            'max_queued_disk_bytes': 8 * MIB,
+            'cache_size': 256,
+            'checking_mem_usage': 32,
+        },
+    ),
+    SessionProfile(
+        'ssd',
+        "Many parallel disk operations and sparse files, since random writes cost little on flash storage.",
+        {
+            'aio_threads': 16,
+            'hashing_threads': 4,
+            'file_pool_size': 100,
+            'max_queued_disk_bytes': 64 * MIB,
+            'piece_extent_affinity': False,
+        },
+    ),
+    SessionProfile(
+        'hdd',
+        "Preallocated files, pieces requested in contiguous extents and a large write queue, so spinning or network "
+        "disks see fewer, longer and more sequential writes.",
+        {
+            'aio_threads': 4,
+            'hashing_threads': 2,
+            'file_pool_size': 40,
+            'max_queued_disk_bytes': 256 * MIB,
+            'piece_extent_affinity': True,
+            'cache_size': 16384,
+            'write_cache_line_size': 128,
+            'coalesce_writes': True,
+            'low_prio_disk': False,
+        },
+        lt.storage_mode_t.storage_mode_allocate,
+    ),
+)}
+
+
+def get_profile(name: str = DOWNLOAD_PROFILE) -> SessionProfile:
+    profile = PROFILES.get(name.lower())
+    if profile is None:
+        logger.warning(f"Unknown session profile '{name}', using the default one. The profiles are: {', '.join(PROFILES)}.")
+        return PROFILES['default']
+    return profile
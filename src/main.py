@@ -2,20 +2,57 @@ from src.utils.logger import setup_logging
 setup_logging()
 
 import asyncio
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
 
 from typing import Optional, Literal
 
-from src.constants import TORRENT_DOWNLOAD_PATH, TORRENT_SUPPORTED_LANGUAGES
+from rich.live import Live
+from rich.spinner import Spinner
+
+from src.constants import TORRENT_SUPPORTED_LANGUAGES, BATCH_SEARCH_WORKERS, MOVIE_STORE_LAZY, RESUME_DATA_DIR
 from src.core.cli import CLI, console
-from src.core.download import TorrentDownloaderWrapper
 from src.core.search import SearchEngine
 from src.schemas.movie_schema import Movie
 
 cli = CLI()
-search_engine = SearchEngine()
+search_engine: Optional[SearchEngine] = None
+
+download_manager = None
+
+def get_search_engine() -> SearchEngine:
+    global search_engine
+    if search_engine is None:
+        # A single command only reads a few movies, so they are built on demand instead of loading the whole store
+        search_engine = SearchEngine(lazy=MOVIE_STORE_LAZY or not cli.interactive, interactive=cli.interactive)
+    return search_engine
+
+def get_download_manager():
+    global download_manager
+    if download_manager is None:
+        # Libtorrent is only loaded by the commands that download something
+        from src.core.download import DownloadManager
+        download_manager = DownloadManager()
+    return download_manager
+
+@contextmanager
+def quiet(enabled: bool = True):
+    """
+    Silences the console, so that nothing but the JSON output is written to stdout.
+    """
+    console.quiet = enabled
+    try:
+        yield
+    finally:
+        console.quiet = False
+
+def print_json(data):
+    print(json.dumps(data, indent=2))
 
 def get_movie_or_warn(movie_id: int):
-    movie = search_engine.get(movie_id)
+    movie = get_search_engine().get(movie_id)
     if not movie:
         console.print("[red]No movie found with that ID.[/red]")
         return None
@@ -30,56 +67,196 @@ def get_movie_or_warn(movie_id: int):
         '--language': ('language', 'Language to search in the torrent files',       'text'    ),
         '-n':         ('files',    'Minimum number of torrents to explore',         'number'  ),
         '--files':    ('files',    'Minimum number of torrents files to explore',   'number'  ),
+        '--json':     ('as_json',  'Print the movies found as JSON',                None      ),
         },
     help_text="Scrapes the page for the given movie title."
 )
-def search(movie_title: str, refresh: bool = False, language: str = None, files: int = None):
-    if not isinstance(refresh, bool):
+def search(movie_title: str, refresh: bool = False, language: str = None, files: int = None, as_json: bool = False):
+    if not isinstance(refresh, bool) or not isinstance(as_json, bool):
         console.print("[red]Invalid option.[/red]")
-        return
+        return False
 
     if language and language.capitalize() not in TORRENT_SUPPORTED_LANGUAGES:
         console.print("[red]Invalid language option.[/red] The supported languages are: {}".format(", ".join(TORRENT_SUPPORTED_LANGUAGES)))
-        return
+        return False
 
     if files and not isinstance(files, int):
         files = int(files)
         if files < 0:
             console.print("[red]Invalid number of files.[/red] Must be a positive number.")
-            return
+            return False
 
-    movies = search_engine.search(movie_title, force=refresh, language=language, torrents=files)
-    if not movies:
-        console.print("[red]No results found.[/red]")
+    if as_json:
+        with quiet(), get_search_engine().stream(movie_title, force=refresh, language=language, torrents=files) as stream:
+            movies = list(stream)
+        print_json([movie.model_dump(mode="json") for movie in movies])
+        return bool(movies)
+
+    with get_search_engine().stream(movie_title, force=refresh, language=language, torrents=files) as movies:
+        if not Movie.print_details(movies):
+            console.print("[red]No results found.[/red]")
+            return False
+
+@cli.command(
+    "batch-search",
+    arguments=[("file", "Path of a text file with one movie title per line")],
+    keyword_args={
+        '--refresh':  ('refresh',  'Overwrite stored movies if possible',            None     ),
+        '-l':         ('language', 'Language to search in the torrent files',       'text'    ),
+        '--language': ('language', 'Language to search in the torrent files',       'text'    ),
+        '-n':         ('files',    'Minimum number of torrents to explore',         'number'  ),
+        '--files':    ('files',    'Minimum number of torrents files to explore',   'number'  ),
+        '-w':         ('workers',  'Number of titles searched at once',             'number'  ),
+        '--workers':  ('workers',  'Number of titles searched at once',             'number'  ),
+        '-o':         ('output',   'Path of the JSON summary, printed if omitted',  'path'    ),
+        '--output':   ('output',   'Path of the JSON summary, printed if omitted',  'path'    ),
+        },
+    help_text="Searches for every movie title listed in a file."
+)
+def batch_search(file: str, refresh: bool = False, language: str = None, files: int = None, workers: int = None, output: str = None):
+    if not isinstance(refresh, bool):
+        console.print("[red]Invalid option.[/red]")
+        return False
+
+    if language and language.capitalize() not in TORRENT_SUPPORTED_LANGUAGES:
+        console.print("[red]Invalid language option.[/red] The supported languages are: {}".format(", ".join(TORRENT_SUPPORTED_LANGUAGES)))
+        return False
+
+    try:
+        files = int(files) if files else None
+        workers = int(workers) if workers else BATCH_SEARCH_WORKERS
+    except ValueError:
+        files = workers = -1
+
+    if (files is not None and files < 0) or workers < 1:
+        console.print("[red]Invalid number of files or workers.[/red] Must be a positive number.")
+        return False
+
+    path = Path(file).expanduser()
+    if not path.is_file():
+        console.print(f"[red]No such file:[/red] {path}")
+        return False
+
+    # Lines starting with `#` are comments
+    titles = [line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip() and not line.strip().startswith("#")]
+
+    summary = get_search_engine().batch_search(titles, force=refresh, language=language, torrents=files, workers=workers)
+
+    if output:
+        Path(output).expanduser().write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        console.print(f"Found [green]{summary['movies']}[/green] movies for {summary['queries']} titles in {summary['seconds']} seconds, summary written to {output}.")
     else:
-        Movie.print_details(movies)
+        print_json(summary)
 
 @cli.command(
     "download",
     arguments=[("id", "ID of the movie to download")],
-    keyword_args={'--torrent': ('torrent', 'Use a torrent ID instead', None)},
-    help_text="Downloads the movie with the given ID."
+    keyword_args={
+        '--torrent':       ('torrent',       'Use a torrent ID instead',                        None    ),
+        '--stream':        ('stream',        'Download the video in order to play it earlier',   None    ),
+        '-l':              ('language',      'Preferred language of the torrent',                'text'  ),
+        '--language':      ('language',      'Preferred language of the torrent',                'text'  ),
+        '--include':       ('include',       'Comma-separated patterns of the files to download', 'text'  ),
+        '--exclude':       ('exclude',       'Comma-separated patterns of the files to skip',     'text'  ),
+        '--min-size':      ('min_size',      'Minimum size of the files to download, in MB',      'number'),
+        '--largest-video': ('largest_video', 'Only download the movie itself',                    None    ),
+    },
+    help_text="Queues the movie with the given ID for download, picking the torrent whose swarm is the fastest."
 )
-def download(idx: int, torrent: bool = False):
-    if not isinstance(torrent, bool):
+def download(
+        idx: int,
+        torrent: bool = False,
+        stream: bool = False,
+        language: str = None,
+        include: str = None,
+        exclude: str = None,
+        min_size: str = None,
+        largest_video: bool = False
+):
+    if not all(isinstance(flag, bool) for flag in (torrent, stream, largest_video)):
         console.print("[red]Invalid option.[/red]")
-        return
+        return False
+
+    try:
+        min_size = float(min_size) if min_size else None
+    except ValueError:
+        min_size = -1
+
+    if min_size is not None and min_size < 0:
+        console.print("[red]Invalid minimum size.[/red] Must be a positive number.")
+        return False
 
-    magnet_link = None
+    queued = None
     if not torrent:
         movie = get_movie_or_warn(int(idx))
-        if movie:
-            magnet_link = movie.torrents[0].magnet_link
+        if movie and movie.torrents:
+            from src.core.selection import TorrentSelector
+
+            spinner = Spinner(name='dots', text=f"Probing the swarms of {len(movie.torrents)} torrents...", style='green')
+            with Live(spinner, console=console, transient=True):
+                queued = TorrentSelector(get_download_manager()).select(movie.torrents, title=movie.title, language=language)
     else:
-        torrent = search_engine.get(int(idx), from_torrents=True)
+        torrent = get_search_engine().get(int(idx), from_torrents=True)
         if not torrent:
             console.print("[red]No torrent found with that ID.[/red]")
         else:
-            magnet_link = torrent.magnet_link
+            queued = get_download_manager().add(torrent.magnet_link, title=torrent.title, torrent_links=torrent.torrent_links)
+
+    if not queued:
+        return False
+
+    if include or exclude or min_size or largest_video:
+        from src.core.files import FileFilter
+
+        file_filter = FileFilter()
+        file_filter.include = [pattern.strip() for pattern in include.split(',')] if include else file_filter.include
+        file_filter.exclude = [pattern.strip() for pattern in exclude.split(',')] if exclude else file_filter.exclude
+        file_filter.min_size = min_size or file_filter.min_size
+        file_filter.largest_video_only = largest_video or file_filter.largest_video_only
+        get_download_manager().filter_files(queued.id, file_filter)
+
+    if stream:
+        get_download_manager().stream(queued.id)
+
+    # A single command waits for its download, the prompt gets back to the user right away
+    if not cli.interactive:
+        asyncio.run(queued.download())
+    else:
+        console.print(f"Queued [green]{queued.name}[/green] as download [blue]{queued.id}[/blue]. Type 'downloads' to follow its progress.")
+
+@cli.command(
+    "downloads",
+    help_text="Lists the queued downloads and their progress."
+)
+def downloads():
+    if download_manager is None or not download_manager.downloads:
+        console.print("[red]No downloads.[/red]")
+        return
+
+    from src.core.download import DownloaderWrapper
+    DownloaderWrapper.print_details(download_manager.downloads)
 
-    if magnet_link:
-        downloader = TorrentDownloaderWrapper(magnet_link, str(TORRENT_DOWNLOAD_PATH))
-        asyncio.run(downloader.start_download())
+@cli.command(
+    "pause",
+    arguments=[("id", "ID of the download to pause")],
+    help_text="Pauses the download with the given ID."
+)
+def pause(download_id):
+    if download_manager is None or not download_manager.pause(int(download_id)):
+        console.print("[red]No download found with that ID.[/red]")
+        return False
+    console.print("[yellow]Download paused.[/yellow]")
+
+@cli.command(
+    "resume",
+    arguments=[("id", "ID of the download to resume")],
+    help_text="Resumes the download with the given ID."
+)
+def resume(download_id):
+    if download_manager is None or not download_manager.resume(int(download_id)):
+        console.print("[red]No download found with that ID.[/red]")
+        return False
+    console.print("[yellow]Download resumed.[/yellow]")
 
 @cli.command(
     "summary",
@@ -88,17 +265,24 @@ def download(idx: int, torrent: bool = False):
 )
 def summary(movie_id):
     movie = get_movie_or_warn(int(movie_id))
-    if movie:
-        movie.print_summary()
+    if not movie:
+        return False
+    movie.print_summary()
 
 @cli.command(
     "torrents",
     arguments=[("id", "ID of the movie to showcase its torrent files")],
+    keyword_args={'--json': ('as_json', 'Print the torrent files as JSON', None)},
     help_text="List the torrent files of the movie with the given ID."
 )
-def torrents(movie_id):
+def torrents(movie_id, as_json: bool = False):
     movie = get_movie_or_warn(int(movie_id))
-    if movie:
+    if not movie:
+        return False
+
+    if as_json:
+        print_json([torrent.model_dump(mode="json") for torrent in movie.torrents])
+    else:
         movie.print_torrents()
 
 @cli.command(
@@ -109,48 +293,50 @@ def torrents(movie_id):
         '--sort':   ('sort',    'Sort movies by attribute (title, year or rating).',    'option'    ),
         '-t':       ('title',   'Filter movies by title',                               'text'      ),
         '--title':  ('title',   'Filter movies by title',                               'text'      ),
+        '--json':   ('as_json', 'Print the movies as JSON',                             None        ),
     },
     help_text="Displays the movie search history."
 )
 def history(
     number: int = 10,
     sort: Literal['title', 'year', 'rating'] = None,
-    title: Optional[str] = None
+    title: Optional[str] = None,
+    as_json: bool = False
 ):
     if sort and sort not in ['title', 'year', 'rating']:
         console.print("[red]Invalid sort option.[/red] The supported options are: [green]title[/green], [green]year[/green], [green]rating[/green].")
-        return
+        return False
 
-    if isinstance(number, int):
+    try:
         number = int(number)
+    except ValueError:
+        number = -1
 
     if number < 0:
         console.print("[red]Invalid number of movies.[/red] Must be a positive number.")
-        return
-
-    movies = search_engine.movies
-
-    # Filter by search text
-    if title:
-        title_lower = title.lower()
-        movies = [movie for movie in movies if title_lower in movie.title.lower()]
+        return False
 
-    # Apply sorting
-    if sort == 'year':
-        movies.sort(key=lambda x: x.year, reverse=True)
-    elif sort == 'rating':
-        movies.sort(key=lambda x: x.rating, reverse=True)
-    elif sort == 'title':
-        movies.sort(key=lambda x: x.title)
+    # Filter by search text, sort and keep the first movies before any of them is built
+    movies = get_search_engine().history(title=title, sort=sort, limit=number)
 
-    # Adjust number
-    if number > len(movies):
-        number = len(movies)
-
-    if not movies:
+    if as_json:
+        print_json([movie.model_dump(mode="json") for movie in movies])
+    elif not movies:
         console.print("[red]No results found.[/red]")
     else:
-        Movie.print_details(movies[:number])
+        Movie.print_details(movies)
 
 if __name__ == "__main__":
-    cli.start()
\ No newline at end of file
+    try:
+        # Run a single command when one is given, e.g. `python -m src.main search "the matrix" --json`
+        if len(sys.argv) > 1:
+            sys.exit(cli.run(sys.argv[1:]))
+
+        # Downloads interrupted by the last exit are picked up again, libtorrent is only loaded if there are any
+        if any(RESUME_DATA_DIR.glob('*.fastresume')):
+            get_download_manager().start()
+
+        cli.start()
+    finally:
+        if search_engine is not None:
+            search_engine.close()
\ No newline at end of file
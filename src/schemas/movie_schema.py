@@ -1,17 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Iterable, Sequence
 
-from bs4 import BeautifulSoup
 from pydantic import Field
+from rich.console import Group
+from rich.live import Live
+from rich.spinner import Spinner
 from rich.table import Table
 from rich.text import Text
 
-from src.constants import TORRENT_BASE_URL, TORRENT_SEARCH_DEPTH, DASH_HEAD
+from src.constants import TORRENT_BASE_URL, TORRENT_SEARCH_DEPTH, TORRENT_FETCH_WORKERS, DASH_HEAD
 from src.core.cli import console
 from src.schemas.media_schema import Media, MediaType
 from src.schemas.torrent_schema import Torrent, Object
+from src.utils.html import parse_html, class_strainer
 from src.utils.requests import requests, logger
 
+# Blocks of the movie page read by `Movie.from_url`
+MOVIE_PAGE_STRAINER = class_strainer(
+    'featured-heading', 'torrent-category', 'torrent-detail-info', 'rating', 'torrent-image', 'table-list-wrap', 'table-list'
+)
+
 
 class Genre(str, Enum):
     ACTION = "Action"
@@ -71,11 +80,20 @@ class Movie(Media):
 
     @classmethod
     def from_url(cls, url: str, language: str = None, torrents: int = None) -> 'Movie':
+        return requests.shared(('movie', url, language, torrents), cls._parse_url, url, language, torrents)
+
+    @classmethod
+    def _parse_url(cls, url: str, language: Optional[str], torrents: Optional[int]) -> 'Movie':
         response = requests.fetch_url(url)
         if not response:
             raise ValueError("Failed to fetch the URL.")
 
-        soup = BeautifulSoup(response, 'html.parser')
+        soup = parse_html(response, parse_only=MOVIE_PAGE_STRAINER)
+
+        # The targeted parse relies on the page layout, fall back to the full page if it missed the title or torrents
+        if not soup.select_one(".featured-heading strong") or ('coll-1' in response and not soup.select('tbody tr')):
+            logger.debug(f"Targeted parse incomplete for {url}, parsing the full page.")
+            soup = parse_html(response)
 
         def get_text(selector: str) -> Optional[str]:
             el = soup.select_one(selector)
@@ -121,22 +139,30 @@ class Movie(Media):
         if torrents_maximum == len(sorted_links):
             logger.info(f"All {torrents_maximum} torrents will be used.")
 
-        torrents = [Torrent.from_url(link) for link in sorted_links[:torrents_maximum] if Torrent.from_url(link)]
+        with ThreadPoolExecutor(max_workers=TORRENT_FETCH_WORKERS, thread_name_prefix="torrents") as executor:
+            torrents = [torrent for torrent in executor.map(Torrent.from_url, sorted_links[:torrents_maximum]) if torrent]
 
-        language_found = language is None
+            language_found = language is None
 
-        if not language_found:
-            for torrent in torrents:
-                if torrent.language.lower() == language.lower():
-                    language_found = True
-                    logger.info(f"Language '{torrent.language}' found in first batch of torrents.")
-
-        if not language_found and torrents_maximum < len(sorted_links):
-            for link in sorted_links[torrents_maximum:]:
-                torrent = Torrent.from_url(link)
-                if torrent:
+            if not language_found:
+                for torrent in torrents:
                     if torrent.language.lower() == language.lower():
+                        language_found = True
+                        logger.info(f"Language '{torrent.language}' found in first batch of torrents.")
+
+            if not language_found and torrents_maximum < len(sorted_links):
+                # Probe the remaining torrents in windows, stopping at the first one in the requested language
+                remaining_links = sorted_links[torrents_maximum:]
+                for start in range(0, len(remaining_links), TORRENT_FETCH_WORKERS):
+                    window = remaining_links[start:start + TORRENT_FETCH_WORKERS]
+                    torrent = next((
+                        torrent for torrent in executor.map(Torrent.from_url, window)
+                        if torrent and torrent.language.lower() == language.lower()
+                    ), None)
+
+                    if torrent:
                         torrents.append(torrent)
+                        language_found = True
                         logger.info(f"Language '{torrent.language}' found in second batch of torrents.")
                         break
 
@@ -159,7 +185,13 @@ class Movie(Media):
         )
 
     @classmethod
-    def print_details(cls, movies):
+    def print_details(cls, movies: Iterable['Movie']) -> int:
+        """
+        Prints the movies as a table. When given an iterator instead of a list, rows are rendered as the movies arrive.
+
+        :param movies: Movies to print.
+        :return: Number of rows printed.
+        """
         table = Table(
             header_style=None,
             box=DASH_HEAD,
@@ -178,10 +210,22 @@ class Movie(Media):
         table.add_column("Genres", no_wrap=True)
         table.add_column("Torrents", justify="right")
 
-        for movie in movies:
-            table = movie.add_row(table)
+        if isinstance(movies, Sequence):
+            for movie in movies:
+                table = movie.add_row(table)
+
+            console.print(table)
+            return len(movies)
+
+        spinner = Spinner(name='dots', text="Processing...", style='green')
+        with Live(spinner, console=console, transient=False) as live:
+            for movie in movies:
+                table = movie.add_row(table)
+                live.update(Group(table, spinner))
+
+            live.update(table if table.row_count else Text(""))
 
-        console.print(table)
+        return table.row_count
 
     @property
     def languages(self) -> list[str]:
@@ -126,12 +126,26 @@ class Size(BaseModel):
 
         return cls(value=value, unit=unit)
 
+    def to_bytes(self) -> int:
+        exponent = {SizeUnit.KB: 1, SizeUnit.MB: 2, SizeUnit.GB: 3}[self.unit]
+        return int(self.value * 1024 ** exponent)
+
     def __str__(self):
         return f"{self.value:.2f} {str(self.unit)}"
 
 
 from bs4 import BeautifulSoup
 
+from src.utils.html import parse_html, class_strainer
+
+# Blocks of the torrent page read by `Torrent.from_url`, leaving out the description and file list tabs
+TORRENT_PAGE_STRAINER = class_strainer(
+    'box-info-heading', 'dropdown-menu', 'download-links-dontblock', 'list', 'category-name', 'comment-detail'
+)
+
+# Blocks of the torrent page read by `Comment.from_html`
+COMMENTS_STRAINER = class_strainer('comment-detail')
+
 
 class Comment(BaseModel):
     user: str = Field(..., description="The username of the person who posted the comment.")
@@ -141,12 +155,18 @@ class Comment(BaseModel):
     @classmethod
     def from_html(cls, html: str | BeautifulSoup) -> list['Comment']:
         if isinstance(html, str):
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = parse_html(html, parse_only=COMMENTS_STRAINER)
+
+            # The targeted parse relies on the page layout, fall back to the full page if it missed the comments
+            if not soup.select_one('.comment-detail') and 'comment-detail' in html:
+                logger.debug("Targeted parse found no comments, parsing the full page.")
+                soup = parse_html(html)
         else:
             soup = html
 
         comments = []
-        comments_section = soup.find('div', {'role': 'tabpanel', 'id': 'comments'})
+        # The comments tab of a full page, or the comments kept by a targeted parse
+        comments_section = soup.find('div', {'role': 'tabpanel', 'id': 'comments'}) or soup
         comment_details = comments_section.find_all('div', class_='comment-detail')
 
         for detail in comment_details:
@@ -200,11 +220,21 @@ class Torrent(Object):
 
     @classmethod
     def from_url(cls, url: str) -> 'Torrent':
+        # The same torrent can be requested by several movies at once, or again later in the same search
+        return requests.shared(('torrent', url), cls._parse_url, url)
+
+    @classmethod
+    def _parse_url(cls, url: str) -> 'Torrent':
         response = requests.fetch_url(url)
         if not response:
             raise ValueError("Failed to fetch the URL.")
 
-        soup = BeautifulSoup(response, 'html.parser')
+        soup = parse_html(response, parse_only=TORRENT_PAGE_STRAINER)
+
+        # The targeted parse relies on the page layout, fall back to the full page if it missed the title or magnet link
+        if not soup.select_one('.box-info-heading h1') or ('magnet:' in response and not soup.select_one('a[href^="magnet:"]')):
+            logger.debug(f"Targeted parse incomplete for {url}, parsing the full page.")
+            soup = parse_html(response)
 
         title_tag = soup.find('div', class_='box-info-heading').find('h1')
         title = title_tag.get_text(strip=True) if title_tag else None
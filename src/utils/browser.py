@@ -0,0 +1,168 @@
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from src.constants import (
+    CHROME_BINARY, SELENIUM_LOAD_STRATEGY, SELENIUM_POOL_SIZE, SELENIUM_IDLE_TIMEOUT, SELENIUM_MAX_PAGES
+)
+
+logger = logging.getLogger(__name__)
+
+CHROME_DRIVER_VERSION = "135.0.7049.84"
+REMOTE_DEBUGGING_PORT = 9222
+
+
+@dataclass
+class Browser:
+    driver: object
+    slot: int
+    pages: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class BrowserPool:
+    """
+    Pool of headless Chromium instances used as fallback when plain requests fail.
+
+    Browsers are started on first use, up to the size limit, and shared between threads. A browser is shut down
+    after it has been idle for too long or once it has loaded a given number of pages.
+    """
+
+    def __init__(self, size: int = SELENIUM_POOL_SIZE, idle_timeout: float = SELENIUM_IDLE_TIMEOUT, max_pages: int = SELENIUM_MAX_PAGES):
+        self._size = max(1, size)
+        self._idle_timeout = idle_timeout
+        self._max_pages = max(1, max_pages)
+
+        self._condition = threading.Condition()
+        self._idle: list[Browser] = []
+        self._free_slots = list(range(self._size))
+        self._closed = False
+        self._stopped = threading.Event()
+
+        self._driver_path = None
+        self._driver_path_lock = threading.Lock()
+        self._reaper = None
+
+        atexit.register(self.close)
+
+    @contextmanager
+    def browser(self):
+        """
+        Borrows a browser from the pool, starting a new one if none is idle and the size limit allows it.
+
+        The browser is discarded instead of returned to the pool if the block raises, including when it is
+        interrupted, so its slot is always given back.
+        """
+        browser = self._acquire()
+        failed = True
+        try:
+            yield browser.driver
+            failed = False
+        finally:
+            self._release(browser, discard=failed)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        self._stopped.set()
+
+        for browser in idle:
+            self._quit(browser)
+
+    def _acquire(self) -> Browser:
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed.")
+                if self._idle:
+                    return self._idle.pop()
+                if self._free_slots:
+                    slot = self._free_slots.pop(0)
+                    break
+                self._condition.wait()
+
+        try:
+            return Browser(driver=self._launch(slot), slot=slot)
+        except BaseException:
+            with self._condition:
+                self._free_slots.append(slot)
+                self._condition.notify()
+            raise
+
+    def _release(self, browser: Browser, discard: bool = False):
+        browser.pages += 1
+        browser.last_used = time.monotonic()
+
+        recycle = discard or browser.pages >= self._max_pages
+        with self._condition:
+            if not recycle and not self._closed:
+                self._idle.append(browser)
+                self._condition.notify()
+                return
+
+        if not discard:
+            logger.debug(f"Recycling browser {browser.slot} after {browser.pages} pages.")
+        self._quit(browser)
+
+    def _quit(self, browser: Browser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            logger.debug(f"Failed to quit browser {browser.slot}: {e}")
+
+        with self._condition:
+            self._free_slots.append(browser.slot)
+            self._condition.notify()
+
+    def _launch(self, slot: int):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+
+        options = Options()
+        options.binary_location = CHROME_BINARY
+        options.page_load_strategy = SELENIUM_LOAD_STRATEGY
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument(f"--remote-debugging-port={REMOTE_DEBUGGING_PORT + slot}")  # This is the critical one
+
+        start_time = time.perf_counter()
+        driver = webdriver.Chrome(service=Service(self._get_driver_path()), options=options)
+        driver.implicitly_wait(4)
+        logger.debug(f"Started browser {slot} in {(time.perf_counter() - start_time):.2f} seconds")
+
+        self._start_reaper()
+        return driver
+
+    def _get_driver_path(self) -> str:
+        with self._driver_path_lock:
+            if self._driver_path is None:
+                from webdriver_manager.chrome import ChromeDriverManager
+                self._driver_path = ChromeDriverManager(driver_version=CHROME_DRIVER_VERSION).install()
+            return self._driver_path
+
+    def _start_reaper(self):
+        with self._condition:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="browser-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap(self):
+        while not self._stopped.wait(timeout=max(self._idle_timeout / 2, 1)):
+            with self._condition:
+                now = time.monotonic()
+                expired = [browser for browser in self._idle if now - browser.last_used >= self._idle_timeout]
+                self._idle = [browser for browser in self._idle if browser not in expired]
+
+            for browser in expired:
+                logger.debug(f"Shutting down browser {browser.slot} after being idle.")
+                self._quit(browser)
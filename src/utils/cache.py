@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+from src.constants import (
+    HTTP_CACHE_DIR, HTTP_CACHE_MAX_SIZE, HTTP_CACHE_TTL_SEARCH, HTTP_CACHE_TTL_MOVIE, HTTP_CACHE_TTL_TORRENT,
+    HTTP_CACHE_TTL_DEFAULT
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: str
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """
+        Conditional request headers used to revalidate this response with the server.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Persistent cache of fetched pages, stored as one file per URL.
+
+    Each page type has its own time to live, so search listings expire quickly while torrent pages are kept for
+    longer. Once the cache grows past its size limit, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: Path = HTTP_CACHE_DIR, max_size: int = HTTP_CACHE_MAX_SIZE):
+        self._directory = directory
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+
+        # Files are touched on every hit, so their modification time keeps the usage order between runs
+        for path in sorted(self._directory.glob("*.json"), key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._size += size
+
+    @staticmethod
+    def ttl(url: str) -> float:
+        path = urlparse(url).path
+        if path.startswith("/sort-category-search/") or path.startswith("/search/"):
+            return HTTP_CACHE_TTL_SEARCH
+        if path.startswith("/movie/"):
+            return HTTP_CACHE_TTL_MOVIE
+        if path.startswith("/torrent/"):
+            return HTTP_CACHE_TTL_TORRENT
+        return HTTP_CACHE_TTL_DEFAULT
+
+    def is_fresh(self, response: CachedResponse) -> bool:
+        return time.time() - response.fetched_at < self.ttl(response.url)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """
+        Returns the cached response for the URL, whether it is still fresh or not.
+        """
+        key = self._key(url)
+        path = self._path(key)
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                response = CachedResponse(**json.load(f))
+            os.utime(path)
+        except (OSError, ValueError, TypeError) as e:
+            logger.debug(f"Discarding unreadable cache entry for {url}: {e}")
+            self._remove(key)
+            return None
+
+        return response if response.url == url else None
+
+    def put(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self._write(CachedResponse(url=url, body=body, fetched_at=time.time(), etag=etag, last_modified=last_modified))
+
+    def refresh(self, response: CachedResponse):
+        """
+        Marks a response as fresh again after the server confirmed it has not changed.
+        """
+        response.fetched_at = time.time()
+        self._write(response)
+
+    def _write(self, response: CachedResponse):
+        key = self._key(response.url)
+        path = self._path(key)
+        temp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        try:
+            with temp_path.open("w", encoding="utf-8") as f:
+                json.dump(asdict(response), f)
+            os.replace(temp_path, path)
+            size = path.stat().st_size
+        except OSError as e:
+            logger.warning(f"Failed to cache response for {response.url}: {e}")
+            temp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = self._evict()
+
+        for key in evicted:
+            self._path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> list[str]:
+        evicted = []
+        while self._size > self._max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            evicted.append(key)
+
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} responses from the cache.")
+        return evicted
+
+    def _remove(self, key: str):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self._directory / f"{key}.json"
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable
+from urllib.parse import urlparse
+
+
+class HostLimiter:
+    """
+    Caps the number of simultaneous requests sent to the same host.
+    """
+
+    def __init__(self, limit: int):
+        self._limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self._limit)
+            return self._semaphores[host]
+
+    @contextmanager
+    def limit(self, url: str):
+        semaphore = self._semaphore(urlparse(url).netloc)
+        with semaphore:
+            yield
+
+
+class SingleFlight:
+    """
+    Runs a function once for all the concurrent callers asking for the same key, which all share its result.
+
+    While a scope is open, results are also remembered, so later callers get them without another call. They are
+    forgotten once the last open scope is closed, or earlier when more than the given number of results are kept.
+    Failures, either exceptions or None results, are never remembered.
+
+    Coroutine functions are run with `do_async`, which shares calls and results with the threads calling `do`.
+    """
+
+    def __init__(self, max_results: int = None):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self._results: OrderedDict[Hashable, Any] = OrderedDict()
+        self._max_results = max_results
+        self._scopes = 0
+
+    @contextmanager
+    def scope(self):
+        with self._lock:
+            self._scopes += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._scopes -= 1
+                if not self._scopes:
+                    self._results.clear()
+
+    def do(self, key: Hashable, function: Callable, *args) -> Any:
+        remembered, future, leader = self._join(key)
+        if remembered:
+            return future
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+
+        self._succeed(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, function: Callable, *args) -> Any:
+        """
+        Same as `do`, awaiting the coroutine function. Callers waiting for a call whose caller is cancelled get None.
+        """
+        remembered, future, leader = self._join(key)
+        if remembered:
+            return future
+        if not leader:
+            # Shielded, so that a caller giving up does not cancel the call for every other caller
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await function(*args)
+        except asyncio.CancelledError:
+            self._succeed(key, future, None)
+            raise
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+
+        self._succeed(key, future, result)
+        return result
+
+    def _join(self, key: Hashable) -> tuple[bool, Any, bool]:
+        """
+        :return: Whether the result is remembered, the result if so or else the future of the call, and whether the
+            caller has to make the call.
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return True, self._results[key], False
+
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            return False, future, leader
+
+    def _fail(self, key: Hashable, future: Future, error: BaseException):
+        with self._lock:
+            del self._calls[key]
+        future.set_exception(error)
+
+    def _succeed(self, key: Hashable, future: Future, result: Any):
+        with self._lock:
+            if self._scopes and result is not None:
+                self._results[key] = result
+                while self._max_results and len(self._results) > self._max_results:
+                    self._results.popitem(last=False)
+            del self._calls[key]
+
+        future.set_result(result)
@@ -0,0 +1,65 @@
+import importlib.util
+import logging
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from src.constants import HTML_PARSER
+
+logger = logging.getLogger(__name__)
+
+# Fastest parser first, `html.parser` ships with Python and is always available
+PARSER_BACKENDS = {
+    'lxml': 'lxml',
+    'html.parser': None,
+}
+
+
+def resolve_parser(name: str = HTML_PARSER) -> str:
+    """
+    Resolves the configured parser name to a backend usable by BeautifulSoup.
+
+    :param name: Parser name, or `auto` to pick the fastest one installed.
+    :return: Parser name.
+    """
+    if name == 'auto':
+        return next(parser for parser, module in PARSER_BACKENDS.items() if not module or importlib.util.find_spec(module))
+
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown HTML parser: '{name}'")
+
+    module = PARSER_BACKENDS[name]
+    if module and not importlib.util.find_spec(module):
+        logger.warning(f"HTML parser '{name}' is not installed, falling back to 'html.parser'.")
+        return 'html.parser'
+
+    return name
+
+
+PARSER = resolve_parser()
+
+
+def parse_html(markup: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """
+    Parses a page with the configured backend.
+
+    :param markup: Page source.
+    :param parse_only: Strainer restricting the tree to the elements it matches, skipping the rest of the page.
+    :return: Parsed page.
+    """
+    return BeautifulSoup(markup, PARSER, parse_only=parse_only)
+
+
+def link_strainer(prefix: str) -> SoupStrainer:
+    """
+    Strainer keeping only the links whose path starts with the given prefix.
+    """
+    return SoupStrainer('a', href=lambda href: href is not None and href.startswith(prefix))
+
+
+def class_strainer(*classes: str) -> SoupStrainer:
+    """
+    Strainer keeping only the elements, and their content, that have any of the given classes.
+    """
+    targets = set(classes)
+    return SoupStrainer(class_=lambda value: value is not None and not targets.isdisjoint(value.split()))
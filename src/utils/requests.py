@@ -1,17 +1,31 @@
+import asyncio
+import importlib.util
 import logging
+import re
+import threading
 import time
+from collections import Counter
+from contextlib import contextmanager
+from enum import Enum
 
 import requests as py_requests
 import urllib3
+from requests.adapters import HTTPAdapter
 
-from src.constants import CHROME_BINARY, SELENIUM_LOAD_STRATEGY
+from src.constants import (
+    HTTP_REQUEST_DEADLINE, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CACHE_ENABLED, SEARCH_MEMO_SIZE
+)
+from src.utils.browser import BrowserPool
+from src.utils.cache import ResponseCache
+from src.utils.concurrency import SingleFlight
+from src.utils.retry import RetryPolicy, RetryBudget, CircuitBreaker
+from src.utils.throttle import Throttle
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Httpx is only imported once the asynchronous API is used, it is not needed to start the application
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
@@ -27,70 +41,477 @@ ERROR_INDICATORS = [
         "no results found"
     ]
 
+# Indicators, among the ones above, of the website refusing to serve us rather than of a missing page
+BLOCK_INDICATORS = [
+    "access denied",
+    "error 403",
+    "you don't have permission",
+]
+
+# Characters at the start of a page searched for the indicators above, along with its title. Block pages are short,
+# while a normal page may quote the same words further down, in a comment or a torrent description
+BLOCK_SCAN_LENGTH = 4096
+
+TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+# Responses telling us to slow down
+THROTTLE_STATUS_CODES = {403, 429, 503}
+
+# Responses worth trying again after a while
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def looks_blocked(text: str) -> bool:
+    """
+    Whether a page is the website refusing to serve us, judging from its title and the start of its source.
+    """
+    title = TITLE_PATTERN.search(text)
+    head = (title.group(1) if title else "") + " " + text[:BLOCK_SCAN_LENGTH]
+    head = head.lower()
+    return any(indicator in head for indicator in BLOCK_INDICATORS)
+
+
+class Outcome(Enum):
+    OK = "ok"
+    BLOCKED = "blocked"
+    TRANSIENT = "transient"
+    FAILED = "failed"
+
+
 class RobustFetcher:
 
     def __init__(self):
         self.session = py_requests.Session()
 
-        # Read from env or use fallback path
-        chrome_binary = CHROME_BINARY
+        # Keep enough idle connections around for every crawl thread to reuse its own
+        adapter = HTTPAdapter(pool_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS, pool_maxsize=HTTP_MAX_KEEPALIVE_CONNECTIONS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Created on first use by the asynchronous API
+        self._async_client = None
+        self._async_loop = None
+
+        # Browsers are only started if a page cannot be fetched with plain requests
+        self.browsers = BrowserPool()
+
+        self.cache = ResponseCache() if HTTP_CACHE_ENABLED else None
+
+        self.throttle = Throttle()
+        self.breaker = CircuitBreaker()
+        self.retry_policy = RetryPolicy()
+        self.retry_budget = RetryBudget()
+
+        # Concurrent requests for the same page share a single fetch, see `shared`
+        self._flights = SingleFlight(max_results=SEARCH_MEMO_SIZE)
+
+        # Number of open scopes revalidating fresh pages, see `search_scope`
+        self._refreshing = 0
+        self._refreshing_lock = threading.Lock()
+
+        # How each page was obtained, see `stats`
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Number of fetches, and of pages served from the cache, revalidated, fetched over plain HTTP, handed over to
+        Selenium or not fetched at all, along with the number of retries and of responses asking us to slow down.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
 
-        options = Options()
-        options.binary_location = chrome_binary
-        options.page_load_strategy = SELENIUM_LOAD_STRATEGY
-        options.add_argument("--headless=new")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--remote-debugging-port=9222")  # This is the critical one
+    def shared(self, key, function, *args):
+        """
+        Calls the function once for all the concurrent callers passing the same key, and once per search while a
+        search scope is open. Pages are shared by URL, and results parsed from them can be shared the same way.
 
-        # Setup ChromeDriver
-        service = Service(ChromeDriverManager(driver_version="135.0.7049.84").install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.driver.implicitly_wait(4)
+        :param key: Hashable key identifying the result.
+        :param function: Function computing the result.
+        :return: Result of the function.
+        """
+        return self._flights.do(key, function, *args)
+
+    async def shared_async(self, key, function, *args):
+        """
+        Same as `shared` for a coroutine function, sharing results with the blocking callers.
+        """
+        return await self._flights.do_async(key, function, *args)
+
+    @contextmanager
+    def search_scope(self, refresh: bool = False):
+        """
+        Context manager remembering every page fetched and every shared result until the last open scope is closed.
+
+        :param refresh: Revalidate cached pages with the server even while they are fresh, as long as the scope is
+            open. Each page is still fetched once per scope.
+        """
+        with self._flights.scope():
+            if not refresh:
+                yield
+                return
+
+            with self._refreshing_lock:
+                self._refreshing += 1
+            try:
+                yield
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing -= 1
+
+    def _is_fresh(self, cached):
+        return cached is not None and not self._refreshing and self.cache.is_fresh(cached)
 
     def fetch_url(self, url, max_retries=3, backoff_factor=3):
+        """
+        Fetches a page, from the cache while it is fresh and revalidating it with the server otherwise, or always
+        revalidating it within a refreshing search scope.
+
+        Concurrent fetches of the same URL are coalesced into one, and pages fetched during a search are reused for
+        the rest of it.
+
+        Plain requests failing with a transient error are retried with jittered backoff, as long as the retry budget
+        allows it and the host is not considered down. Selenium is only used when the website blocks plain requests.
+
+        :param url: URL to fetch.
+        :param max_retries: Number of Selenium attempts.
+        :param backoff_factor: Growth of the jittered wait between Selenium attempts.
+        :return: Page source, a stale copy from the cache if the page could not be fetched, or None.
+        """
+        return self.shared(url, self._fetch_url, url, max_retries, backoff_factor)
+
+    def _fetch_url(self, url, max_retries, backoff_factor):
         logger.debug(f"Fetching URL: {url}")
+        self._count("fetches")
+
+        cached = self.cache.get(url) if self.cache else None
+        if self._is_fresh(cached):
+            logger.debug("Fetched successfully from the cache.")
+            self._count("cache_hits")
+            return cached.body
+
+        token = self.breaker.allow(url)
+        if token is None:
+            logger.warning(f"Not fetching {url}, its host is unreachable.")
+            return self._give_up(url, cached)
 
-        # First try using requests
+        self.retry_budget.record_request()
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            logger.debug("Fetched successfully with requests.")
-            return str(response.text)
-        except Exception as e:
-            logger.debug(f"Requests failed because of a {e.__class__.__name__} exception: {e}")
-            logger.warning(f"Requests failed for {url}. Falling back to Selenium.")
-
-            # Retry loop for Selenium
-            for attempt in range(max_retries):
+            for attempt in range(self.retry_policy.attempts):
                 try:
-                    self.driver.get(url)
-
-                    page_source = self.driver.page_source
-
-                    # Common error message patterns
-                    error_indicators = [
-                        "access denied"
-                    ]
-
-                    if any(error.lower() in page_source.lower() for error in error_indicators):
-                        logger.warning(f"Selenium fetched the page, but it may have been blocked or denied")
-                        raise Exception("Page blocked or denied")
-
-                    if page_source:
-                        logger.debug("Selenium fetch returned a non-empty page source.")
-                        return str(page_source)
-                except Exception as se:
-                    logger.debug(f"Selenium requests failed because of a {e.__class__.__name__} exception")
-                    logger.debug(f"Selenium attempt {attempt + 1} failed: {se}")
-                    if attempt < max_retries - 1:
-                        sleep_time = backoff_factor ** attempt
-                        logger.debug(f"Retrying after {sleep_time} seconds...")
-                        time.sleep(sleep_time)
-                    else:
-                        logger.error(f"Selenium failed after {max_retries} attempts for {url}: {se}")
-                        return None
-
-requests = RobustFetcher()
\ No newline at end of file
+                    with self.throttle.request(url) as permit:
+                        response = self.session.get(url, timeout=HTTP_REQUEST_DEADLINE, headers=cached.validators if cached else None)
+                        outcome = self._classify(url, permit, response.status_code, response.headers, response.text)
+                except py_requests.RequestException as e:
+                    logger.debug(f"Requests failed because of a {e.__class__.__name__} exception: {e}")
+                    outcome = self._classify_error(url, isinstance(e, (py_requests.Timeout, py_requests.ConnectionError)))
+
+                if outcome is Outcome.OK:
+                    logger.debug("Fetched successfully with requests.")
+                    return self._accept(url, cached, response.status_code, str(response.text), response.headers)
+                if outcome is not Outcome.TRANSIENT:
+                    break
+
+                delay = self._retry_delay(url, attempt)
+                if delay is None:
+                    break
+                time.sleep(delay)
+        finally:
+            self.breaker.release(url, token)
+
+        if outcome is Outcome.BLOCKED:
+            logger.warning(f"Requests were blocked for {url}. Falling back to Selenium.")
+            page_source = self._fetch_with_selenium(url, max_retries, backoff_factor)
+            return self._cache_response(url, page_source) if page_source else self._give_up(url, cached)
+
+        return self._give_up(url, cached)
+
+    def fetch_bytes(self, url):
+        """
+        Downloads a binary file, such as a .torrent file. Files are neither cached nor fetched with Selenium, but
+        transient failures are retried like pages are.
+
+        :param url: URL of the file.
+        :return: File content, or None if it could not be downloaded.
+        """
+        logger.debug(f"Fetching file: {url}")
+        self._count("fetches")
+
+        token = self.breaker.allow(url)
+        if token is None:
+            logger.warning(f"Not fetching {url}, its host is unreachable.")
+            return self._give_up(url, None)
+
+        self.retry_budget.record_request()
+        try:
+            for attempt in range(self.retry_policy.attempts):
+                try:
+                    with self.throttle.request(url) as permit:
+                        response = self.session.get(url, timeout=HTTP_REQUEST_DEADLINE)
+                        outcome = self._classify(url, permit, response.status_code, response.headers, "")
+                except py_requests.RequestException as e:
+                    logger.debug(f"Requests failed because of a {e.__class__.__name__} exception: {e}")
+                    outcome = self._classify_error(url, isinstance(e, (py_requests.Timeout, py_requests.ConnectionError)))
+
+                if outcome is Outcome.OK:
+                    self._count("http")
+                    return response.content
+                if outcome is not Outcome.TRANSIENT:
+                    break
+
+                delay = self._retry_delay(url, attempt)
+                if delay is None:
+                    break
+                time.sleep(delay)
+        finally:
+            self.breaker.release(url, token)
+
+        return self._give_up(url, None)
+
+    async def fetch_url_async(self, url, deadline=HTTP_REQUEST_DEADLINE, max_retries=3, backoff_factor=3):
+        """
+        Asyncio counterpart of `fetch_url`, sharing a keep-alive connection pool between every request of the
+        running event loop. Fetches of the same URL are coalesced with the blocking ones, and pages fetched during a
+        search are reused by both.
+
+        The deadline covers the whole fetch, including retries and the Selenium fallback. Cancelling the calling task
+        aborts the request, although a Selenium fallback already running in its worker thread finishes on its own.
+
+        :param url: URL to fetch.
+        :param deadline: Maximum number of seconds the fetch may take.
+        :param max_retries: Number of Selenium attempts.
+        :param backoff_factor: Growth of the jittered wait between Selenium attempts.
+        :return: Page source, a stale copy from the cache if the page could not be fetched, or None.
+        """
+        try:
+            async with asyncio.timeout(deadline):
+                if not HTTPX_AVAILABLE:
+                    return await asyncio.to_thread(self.fetch_url, url, max_retries, backoff_factor)
+                return await self.shared_async(url, self._fetch_url_async, url, max_retries, backoff_factor)
+        except TimeoutError:
+            logger.error(f"Fetching {url} exceeded the deadline of {deadline} seconds.")
+            self._count("failed")
+            return None
+
+    async def _fetch_url_async(self, url, max_retries, backoff_factor):
+        import httpx
+
+        logger.debug(f"Fetching URL asynchronously: {url}")
+        self._count("fetches")
+
+        cached = self.cache.get(url) if self.cache else None
+        if self._is_fresh(cached):
+            logger.debug("Fetched successfully from the cache.")
+            self._count("cache_hits")
+            return cached.body
+
+        token = self.breaker.allow(url)
+        if token is None:
+            logger.warning(f"Not fetching {url}, its host is unreachable.")
+            return self._give_up(url, cached)
+
+        self.retry_budget.record_request()
+        try:
+            client = await self._get_async_client()
+            for attempt in range(self.retry_policy.attempts):
+                try:
+                    async with self.throttle.request_async(url) as permit:
+                        response = await client.get(url, headers=cached.validators if cached else None)
+                        outcome = self._classify(url, permit, response.status_code, response.headers, response.text)
+                except httpx.HTTPError as e:
+                    logger.debug(f"Httpx failed because of a {e.__class__.__name__} exception: {e}")
+                    outcome = self._classify_error(url, isinstance(e, httpx.TransportError))
+
+                if outcome is Outcome.OK:
+                    logger.debug(f"Fetched successfully with httpx over {response.http_version}.")
+                    return self._accept(url, cached, response.status_code, str(response.text), response.headers)
+                if outcome is not Outcome.TRANSIENT:
+                    break
+
+                delay = self._retry_delay(url, attempt)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self.breaker.release(url, token)
+
+        if outcome is Outcome.BLOCKED:
+            logger.warning(f"Httpx was blocked for {url}. Falling back to Selenium.")
+            page_source = await asyncio.to_thread(self._fetch_with_selenium, url, max_retries, backoff_factor)
+            return self._cache_response(url, page_source) if page_source else self._give_up(url, cached)
+
+        return self._give_up(url, cached)
+
+    async def fetch_many_async(self, urls, deadline=HTTP_REQUEST_DEADLINE):
+        """
+        Fetches several URLs concurrently. If the calling task is cancelled, every pending fetch is cancelled with it.
+
+        :param urls: URLs to fetch.
+        :param deadline: Maximum number of seconds each fetch may take.
+        :return: Dictionary mapping each URL to its page source, or None if it could not be fetched.
+        """
+        urls = list(dict.fromkeys(urls))
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(self.fetch_url_async(url, deadline=deadline)) for url in urls]
+
+        return {url: task.result() for url, task in zip(urls, tasks, strict=True)}
+
+    def _classify(self, url, permit, status_code, headers, text):
+        """
+        Sorts a response into success, blocked, transient or definitive failure, and lets the throttle and the
+        circuit breaker know how the website responded.
+        """
+        if status_code in (200, 304):
+            outcome = Outcome.BLOCKED if looks_blocked(text) else Outcome.OK
+        elif status_code == 403:
+            outcome = Outcome.BLOCKED
+        elif status_code in RETRY_STATUS_CODES:
+            outcome = Outcome.TRANSIENT
+        else:
+            outcome = Outcome.FAILED
+
+        throttled = status_code in THROTTLE_STATUS_CODES or outcome is Outcome.BLOCKED
+        retry_after = headers.get("Retry-After")
+        permit.report(throttled, float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if throttled:
+            logger.debug(f"Throttled with a {status_code} response, concurrency limit lowered.")
+            self._count("throttled")
+
+        # Rate limiting and blocking both prove the host is up, only server errors count against it
+        if status_code >= 500:
+            self.breaker.record_failure(url)
+        else:
+            self.breaker.record_success(url)
+
+        if outcome is Outcome.FAILED:
+            logger.warning(f"Fetching {url} failed with a {status_code} response.")
+        return outcome
+
+    def _classify_error(self, url, transient):
+        """
+        Same as `_classify` for requests that did not get a response.
+        """
+        if not transient:
+            return Outcome.FAILED
+
+        self.breaker.record_failure(url)
+        return Outcome.TRANSIENT
+
+    def _retry_delay(self, url, attempt):
+        """
+        :return: Seconds to wait before retrying, or None if the request should not be retried.
+        """
+        if attempt + 1 >= self.retry_policy.attempts:
+            return None
+        # Only requests to a healthy host are retried, a probe gets a single attempt
+        if not self.breaker.is_closed(url):
+            return None
+        if not self.retry_budget.try_spend():
+            logger.debug(f"Retry budget exhausted, not retrying {url}.")
+            return None
+
+        delay = self.retry_policy.delay(attempt)
+        logger.debug(f"Retrying {url} after {delay:.2f} seconds...")
+        self._count("retries")
+        return delay
+
+    def _accept(self, url, cached, status_code, text, headers):
+        if cached and status_code == 304:
+            logger.debug("Cached page revalidated.")
+            self._count("revalidated")
+            self.cache.refresh(cached)
+            return cached.body
+
+        self._count("http")
+        return self._cache_response(url, text, headers)
+
+    def _give_up(self, url, cached):
+        self._count("failed")
+        if cached:
+            logger.warning(f"Could not fetch {url}, using the copy cached on {time.ctime(cached.fetched_at)}.")
+            return cached.body
+
+        logger.error(f"Could not fetch {url}.")
+        return None
+
+    def _cache_response(self, url, body, headers=None):
+        if self.cache and body:
+            headers = headers or {}
+            self.cache.put(url, body, etag=headers.get("ETag"), last_modified=headers.get("Last-Modified"))
+        return body
+
+    async def aclose(self):
+        """
+        Closes the connections of the asynchronous API. Meant to be awaited before the event loop using it ends.
+        """
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def _get_async_client(self):
+        # Connections are bound to the event loop that opened them, so a new loop needs a new pool
+        loop = asyncio.get_running_loop()
+        if self._async_client is not None and self._async_loop is not loop:
+            logger.debug("Closing the connections opened by a previous event loop.")
+            try:
+                await self.aclose()
+            except RuntimeError as e:
+                logger.debug(f"Could not close the connections of a previous event loop: {e}")
+
+        if self._async_client is None:
+            import httpx
+
+            self._async_client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                follow_redirects=True,
+                timeout=httpx.Timeout(HTTP_REQUEST_DEADLINE),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                headers=dict(self.session.headers),
+            )
+            self._async_loop = loop
+
+        return self._async_client
+
+    def _fetch_with_selenium(self, url, max_retries=3, backoff_factor=3):
+        self._count("selenium")
+        policy = RetryPolicy(attempts=max_retries, base=1, multiplier=backoff_factor)
+
+        # Retry loop for Selenium
+        for attempt in range(max_retries):
+            try:
+                with self.browsers.browser() as driver:
+                    driver.get(url)
+                    page_source = driver.page_source
+
+                if looks_blocked(page_source):
+                    logger.warning(f"Selenium fetched the page, but it may have been blocked or denied")
+                    raise Exception("Page blocked or denied")
+
+                if page_source:
+                    logger.debug("Selenium fetch returned a non-empty page source.")
+                    return str(page_source)
+            except Exception as se:
+                logger.debug(f"Selenium requests failed because of a {se.__class__.__name__} exception")
+                logger.debug(f"Selenium attempt {attempt + 1} failed: {se}")
+                if attempt < max_retries - 1:
+                    sleep_time = policy.delay(attempt)
+                    logger.debug(f"Retrying after {sleep_time:.2f} seconds...")
+                    time.sleep(sleep_time)
+                else:
+                    logger.error(f"Selenium failed after {max_retries} attempts for {url}: {se}")
+                    return None
+
+requests = RobustFetcher()
@@ -0,0 +1,162 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+from src.constants import (
+    HTTP_RETRY_ATTEMPTS, HTTP_RETRY_BASE_DELAY, HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BUDGET, HTTP_CIRCUIT_FAILURES,
+    HTTP_CIRCUIT_RESET_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: each wait is drawn uniformly between zero and the exponential delay, so
+    clients failing together do not retry together.
+    """
+
+    def __init__(
+            self,
+            attempts: int = HTTP_RETRY_ATTEMPTS,
+            base: float = HTTP_RETRY_BASE_DELAY,
+            cap: float = HTTP_RETRY_MAX_DELAY,
+            multiplier: float = 2
+    ):
+        self.attempts = max(1, attempts)
+        self._base = base
+        self._cap = cap
+        self._multiplier = multiplier
+
+    def delay(self, retry: int) -> float:
+        """
+        :param retry: Number of retries already made.
+        :return: Seconds to wait before the next attempt.
+        """
+        return random.uniform(0, min(self._cap, self._base * self._multiplier ** retry))
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the requests sent over a sliding window, so a failing website does not receive
+    several times the usual traffic. A few retries are always allowed to keep quiet periods from starving.
+    """
+
+    def __init__(self, ratio: float = HTTP_RETRY_BUDGET, minimum: int = 10, window: float = 10.0):
+        self._ratio = ratio
+        self._minimum = minimum
+        self._window = window
+
+        self._lock = threading.Lock()
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+
+    def record_request(self):
+        with self._lock:
+            self._requests.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        """
+        Takes a retry out of the budget.
+
+        :return: Whether the retry is allowed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for timestamps in (self._requests, self._retries):
+                while timestamps and now - timestamps[0] > self._window:
+                    timestamps.popleft()
+
+            if len(self._retries) >= self._minimum + self._ratio * len(self._requests):
+                return False
+
+            self._retries.append(now)
+            return True
+
+
+# Token of the requests sent while the circuit is closed, which never hold the probe
+PASS = object()
+
+
+@dataclass
+class Circuit:
+    failures: int = 0
+    opened_at: Optional[float] = None
+    # Token of the request probing the host, see `CircuitBreaker.allow`
+    probe: Optional[object] = None
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after several consecutive failures.
+
+    Once open, the circuit rejects every request until the reset timeout has passed. A single probe request is then
+    let through: the circuit closes if it succeeds and opens again if it fails. A probe that ends without telling
+    either, such as a cancelled request, is released so that the next request probes the host instead. Only the
+    request holding the token of the probe can release it.
+    """
+
+    def __init__(self, failures: int = HTTP_CIRCUIT_FAILURES, reset_timeout: float = HTTP_CIRCUIT_RESET_TIMEOUT):
+        self._threshold = max(1, failures)
+        self._reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._circuits: dict[str, Circuit] = {}
+
+    def allow(self, url: str) -> Optional[object]:
+        """
+        :return: Token to hand over to `release` once the request has ended, or None if it must not be sent.
+        """
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.opened_at is None:
+                return PASS
+            if circuit.probe is not None or time.monotonic() - circuit.opened_at < self._reset_timeout:
+                return None
+
+            circuit.probe = object()
+            return circuit.probe
+
+    def is_closed(self, url: str) -> bool:
+        with self._lock:
+            return self._circuit(url).opened_at is None
+
+    def record_success(self, url: str):
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.opened_at is not None:
+                logger.info(f"{urlparse(url).netloc} is reachable again.")
+            circuit.failures = 0
+            circuit.opened_at = None
+            circuit.probe = None
+
+    def record_failure(self, url: str):
+        with self._lock:
+            circuit = self._circuit(url)
+            circuit.failures += 1
+            if circuit.probe is not None or (circuit.opened_at is None and circuit.failures >= self._threshold):
+                logger.warning(f"{urlparse(url).netloc} failed {circuit.failures} times in a row, pausing requests for {self._reset_timeout} seconds.")
+                circuit.opened_at = time.monotonic()
+                circuit.probe = None
+
+    def release(self, url: str, token: object):
+        """
+        Ends a request, letting another probe through if it was the probe and no outcome was recorded for it.
+
+        :param token: Token returned by `allow` for the request.
+        """
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.probe is token:
+                circuit.probe = None
+
+    def _circuit(self, url: str) -> Circuit:
+        host = urlparse(url).netloc
+        if host not in self._circuits:
+            self._circuits[host] = Circuit()
+        return self._circuits[host]
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional
+from urllib.parse import urlparse
+
+from src.constants import (
+    HTTP_RATE_LIMIT, HTTP_RATE_BURST, HTTP_CONCURRENCY_MIN, HTTP_CONCURRENCY_INITIAL, HTTP_CONCURRENCY_MAX
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks for a free slot while waiting inside an event loop
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """
+    Spaces requests out to a steady rate, while letting short bursts through.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self._rate = rate
+        self._capacity = max(1.0, burst)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token, borrowing it ahead of time if the bucket is empty.
+
+        :return: Seconds to wait before the token may be used.
+        """
+        if self._rate <= 0:
+            return 0.0
+
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def pause(self, seconds: float):
+        """
+        Holds back every request for the given number of seconds, on top of the ones already waiting.
+        """
+        if self._rate <= 0:
+            return
+
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self._rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of requests in flight with additive increase and multiplicative decrease.
+
+    Every healthy response widens the limit by a fraction of a slot, so it grows by about one slot per round of
+    requests, and every throttled response cuts it by the decrease factor. Responses to requests sent before the last
+    cut are not counted again, so a single burst of rejections only halves the limit once.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease: float = 0.5):
+        self._minimum = max(1, minimum)
+        self._maximum = max(self._minimum, maximum)
+        self._limit = float(min(max(initial, self._minimum), self._maximum))
+        self._decrease = decrease
+
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> float:
+        """
+        Waits for a free slot.
+
+        :return: Time the slot was taken, to be given back on release.
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def try_acquire(self) -> Optional[float]:
+        with self._condition:
+            if self._in_flight >= int(self._limit):
+                return None
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, throttled: Optional[bool] = None):
+        """
+        Gives a slot back and adjusts the limit to the outcome of its request.
+
+        :param started: Time returned when the slot was taken.
+        :param throttled: Whether the server pushed back, or None if the request failed for another reason.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            previous = int(self._limit)
+
+            if throttled and started >= self._last_decrease:
+                self._limit = max(self._minimum, self._limit * self._decrease)
+                self._last_decrease = time.monotonic()
+            elif throttled is False:
+                self._limit = min(self._maximum, self._limit + 1 / self._limit)
+
+            if int(self._limit) != previous:
+                logger.debug(f"Concurrency limit changed from {previous} to {int(self._limit)}.")
+            self._condition.notify_all()
+
+
+class Permit:
+    """
+    Right to send one request, on which the caller reports how the server responded.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self._bucket = bucket
+        self.throttled: Optional[bool] = None
+
+    def report(self, throttled: bool, retry_after: Optional[float] = None):
+        self.throttled = throttled
+        if throttled and retry_after:
+            logger.debug(f"Server asked to retry after {retry_after} seconds.")
+            self._bucket.pause(retry_after)
+
+
+class Throttle:
+    """
+    Per-host rate limiter and adaptive concurrency controller.
+
+    Each host gets its own token bucket, which caps the request rate, and its own AIMD controller, which finds how
+    many requests the host accepts at once. Throttled responses also pause the host for as long as it asks.
+    """
+
+    def __init__(
+            self,
+            rate: float = HTTP_RATE_LIMIT,
+            burst: float = HTTP_RATE_BURST,
+            initial: int = HTTP_CONCURRENCY_INITIAL,
+            minimum: int = HTTP_CONCURRENCY_MIN,
+            maximum: int = HTTP_CONCURRENCY_MAX
+    ):
+        self._rate = rate
+        self._burst = burst
+        self._initial = initial
+        self._minimum = minimum
+        self._maximum = maximum
+
+        self._lock = threading.Lock()
+        self._hosts: dict[str, tuple[TokenBucket, AdaptiveConcurrency]] = {}
+
+    def limit(self, url: str) -> int:
+        return self._host(url)[1].limit
+
+    @contextmanager
+    def request(self, url: str):
+        bucket, concurrency = self._host(url)
+        started = concurrency.acquire()
+        permit = Permit(bucket)
+        try:
+            time.sleep(bucket.reserve())
+            yield permit
+        finally:
+            concurrency.release(started, permit.throttled)
+
+    @asynccontextmanager
+    async def request_async(self, url: str):
+        bucket, concurrency = self._host(url)
+        while (started := concurrency.try_acquire()) is None:
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+        permit = Permit(bucket)
+        try:
+            await asyncio.sleep(bucket.reserve())
+            yield permit
+        finally:
+            concurrency.release(started, permit.throttled)
+
+    def _host(self, url: str) -> tuple[TokenBucket, AdaptiveConcurrency]:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (
+                    TokenBucket(self._rate, self._burst),
+                    AdaptiveConcurrency(self._initial, self._minimum, self._maximum),
+                )
+            return self._hosts[host]
@@ -0,0 +1,2 @@
+# The schemas import each other, load them in the order the application does
+import src.schemas.movie_schema  # noqa: F401
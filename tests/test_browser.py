@@ -0,0 +1,37 @@
+import pytest
+
+from src.utils.browser import BrowserPool
+
+
+class FakeDriver:
+    def quit(self):
+        pass
+
+
+def make_pool() -> BrowserPool:
+    pool = BrowserPool(size=1)
+    pool._launch = lambda slot: FakeDriver()
+    return pool
+
+
+def test_interrupted_block_gives_its_slot_back():
+    pool = make_pool()
+
+    with pytest.raises(KeyboardInterrupt):
+        with pool.browser():
+            raise KeyboardInterrupt
+
+    # The only slot is free again, a second browser would wait forever otherwise
+    with pool.browser() as driver:
+        assert isinstance(driver, FakeDriver)
+    pool.close()
+
+
+def test_browser_is_reused_after_a_clean_block():
+    pool = make_pool()
+
+    with pool.browser() as first:
+        pass
+    with pool.browser() as second:
+        assert second is first
+    pool.close()
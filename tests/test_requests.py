@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from src.utils.requests import Outcome, RobustFetcher, looks_blocked
+
+BLOCK_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Access denied | 1337x.to used Cloudflare to restrict access</title></head>
+<body><h1>Error 1020</h1></body>
+</html>"""
+
+# A torrent page long enough for its comments to sit past the start of the source
+TORRENT_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Download The Matrix (1999) Torrent | 1337x</title></head>
+<body>
+<div class="box-info-heading"><h1>The Matrix (1999)</h1></div>
+<div class="description">{filler}</div>
+<div class="comment-detail"><a class="user">neo</a><p>Access denied by my ISP, had to use a VPN.</p></div>
+</body>
+</html>""".format(filler="Lorem ipsum dolor sit amet. " * 500)
+
+
+def classify(text: str) -> Outcome:
+    fetcher = RobustFetcher()
+    permit = SimpleNamespace(report=lambda throttled, retry_after: None)
+    return fetcher._classify('https://1337x.to/torrent/1/the-matrix/', permit, 200, {}, text)
+
+
+def test_block_page_is_blocked():
+    assert looks_blocked(BLOCK_PAGE)
+    assert classify(BLOCK_PAGE) is Outcome.BLOCKED
+
+
+def test_comment_saying_access_denied_is_not_a_block():
+    assert not looks_blocked(TORRENT_PAGE)
+    assert classify(TORRENT_PAGE) is Outcome.OK
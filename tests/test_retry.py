@@ -0,0 +1,36 @@
+from src.utils.retry import CircuitBreaker
+
+URL = 'https://example.com/page'
+
+
+def open_circuit() -> CircuitBreaker:
+    breaker = CircuitBreaker(failures=1, reset_timeout=0)
+    breaker.record_failure(URL)
+    return breaker
+
+
+def test_only_the_probe_releases_the_probe():
+    breaker = open_circuit()
+    probe = breaker.allow(URL)
+    assert probe is not None
+
+    # Rejected while the probe is in flight, and a request that started earlier ending changes nothing
+    assert breaker.allow(URL) is None
+    breaker.release(URL, object())
+    assert breaker.allow(URL) is None
+
+    breaker.release(URL, probe)
+    assert breaker.allow(URL) is not None
+
+
+def test_requests_of_a_closed_circuit_do_not_release_a_later_probe():
+    breaker = CircuitBreaker(failures=1, reset_timeout=0)
+    token = breaker.allow(URL)
+    breaker.record_failure(URL)
+
+    probe = breaker.allow(URL)
+    breaker.release(URL, token)
+    assert breaker.allow(URL) is None
+
+    breaker.release(URL, probe)
+    assert breaker.allow(URL) is not None
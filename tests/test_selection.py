@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from src.core.selection import TorrentSelector
+
+
+class FakeDownload:
+    def __init__(self, download_id: int):
+        self.id = download_id
+        self.handle = SimpleNamespace(move_storage=lambda path: None)
+
+    def status(self):
+        return SimpleNamespace(
+            has_metadata=False, num_peers=0, num_seeds=0, list_seeds=0, distributed_copies=0, total_payload_download=0
+        )
+
+    def add_listener(self, listener):
+        pass
+
+    def remove_listener(self, listener):
+        pass
+
+    def resume(self):
+        pass
+
+
+class FakeManager:
+    save_path = '/tmp'
+
+    def __init__(self):
+        self.downloads = []
+        self.added = []
+
+    def add(self, magnet_link, **kwargs):
+        self.added.append(magnet_link)
+        return FakeDownload(len(self.added))
+
+    def remove(self, download_id, delete_files=False):
+        pass
+
+
+def make_torrent(magnet_link: str):
+    return SimpleNamespace(
+        title=magnet_link, language='English', magnet_link=magnet_link, torrent_links=[], size=None
+    )
+
+
+def test_duplicate_in_front_of_the_candidate_limit_keeps_its_place():
+    torrents = [make_torrent(link) for link in ('a', 'b', 'a', 'c')]
+
+    manager = FakeManager()
+    TorrentSelector(manager, probe_seconds=0.01, candidates=2).select(torrents)
+
+    assert manager.added == ['a', 'b']
+
+
+def test_best_seeded_duplicate_is_picked_without_probing():
+    torrents = [make_torrent(link) for link in ('a', 'b', 'a')]
+
+    manager = FakeManager()
+    TorrentSelector(manager, probe_seconds=0).select(torrents)
+
+    assert manager.added == ['a']